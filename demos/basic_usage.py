@@ -89,10 +89,11 @@ def routine5():
     esl_func = ESL.from_func(func=func_test)
     dv = esl_func.data_view()
     print('{}+{}->{}'.format(dv.inn.in_a,dv.inn.in_b,dv.inn.__ret_0__))
+    print('cache of func_test: {}'.format(func_test.cache_stats()))
 
 
-@auto_save
-# @auto_load
+# @auto_save
+@auto_load
 def timable_func(in_a):
     for i in range(in_a):
         print('i:{}'.format(i))
@@ -101,9 +102,10 @@ def timable_func(in_a):
 
 def routine6():
     '''
-        define data process function with auto-saving mode, and read input/output data.
+        define data process function with auto-loading mode, the second call with the same argument is loaded from the cache.
     '''
     print(timable_func(in_a=10))
+    print(timable_func(in_a=10))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import subprocess
+import tempfile
+
+'''
+    benchmark of "import esl" and the latency of the first register of an inner data.
+    "eager" imports all the installed backends before esl as the former versions did,
+    "lazy" only imports what the registered data needs.
+'''
+
+_BACKENDS_ = ['numpy','pandas','torch','dgl','networkx']
+
+_SCRIPT_ = '''
+import sys
+import time
+import json
+import importlib
+sys.path.insert(0,{repo!r})
+st = time.perf_counter()
+if {eager!r}:
+    for module_name in {backends!r}:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            pass
+import esl
+t_import = time.perf_counter() - st
+esl.ESL.config_meta_path(save_path={save_path!r})
+st = time.perf_counter()
+esl.ESL.from_cluster(cluster_name='bench').register(step=1)
+t_register = time.perf_counter() - st
+print(json.dumps({{'import':t_import,'register':t_register,'loaded':[m for m in {backends!r} if m in sys.modules]}}))
+'''
+
+
+def run_once(eager):
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as save_path:
+        script = _SCRIPT_.format(repo=repo,eager=eager,backends=_BACKENDS_,save_path=save_path)
+        out = subprocess.run([sys.executable,'-c',script],stdout=subprocess.PIPE,check=True).stdout
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+def bench(repeat=5):
+    for mode,eager in [('eager',True),('lazy',False)]:
+        results = [run_once(eager) for _ in range(repeat)]
+        t_import = min(res['import'] for res in results)
+        t_register = min(res['register'] for res in results)
+        print('{:<6} import esl: {:8.1f} ms | first register: {:8.1f} ms | backends loaded: {}'.format(
+            mode,t_import * 1000,t_register * 1000,results[0]['loaded']))
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from esl.wrapper import InnerWrapper
+
+'''
+    benchmark of the inner data storage: dump / load throughput and file size of the typed binary encoding of
+    InnerWrapper (msgpack if installed, else pickle protocol 5) against the json files of the former versions.
+    throughput is counted in bytes of the json text, so both columns are comparable.
+'''
+
+
+def make_datasets(n=1 << 20):
+    rnd = random.Random(0)
+    return {
+        'int list':list(range(n)),
+        'float list':[rnd.random() for _ in range(n)],
+        'records':[{'id':idx,'name':'item-{}'.format(idx),'score':rnd.random(),'tags':['a','b']} for idx in range(n // 16)],
+        'nested dict':{'layer{}'.format(idx):{'w':[rnd.random() for _ in range(256)],'step':idx} for idx in range(n // 256)},
+    }
+
+
+def json_dump(path,data):
+    with open(path,'w') as f:
+        json.dump(data,f)
+
+
+def json_load(path):
+    with open(path,'r') as f:
+        return json.load(f)
+
+
+def esl_dump(path,data):
+    with open(path,'wb') as f:
+        f.write(InnerWrapper.encode(data))
+
+
+def esl_load(path):
+    with open(path,'rb') as f:
+        return InnerWrapper.decode(f.read())
+
+
+def timeit(func,repeat):
+    best = None
+    for _ in range(repeat):
+        st = time.perf_counter()
+        func()
+        cost = time.perf_counter() - st
+        best = cost if best is None else min(best,cost)
+    return best
+
+
+def bench(repeat=3):
+    with tempfile.TemporaryDirectory() as save_path:
+        for name,data in make_datasets().items():
+            n_bytes = len(json.dumps(data))
+            for mode,dump,load in [('json',json_dump,json_load),('esl',esl_dump,esl_load)]:
+                path = os.path.join(save_path,'{}.{}'.format(name.replace(' ','_'),mode))
+                t_dump = timeit(lambda: dump(path,data),repeat)
+                t_load = timeit(lambda: load(path),repeat)
+                assert load(path) == data
+                print('{:<12} {:<5} dump: {:8.1f} MB/s | load: {:8.1f} MB/s | size: {:8.2f} MB'.format(
+                    name,mode,n_bytes / t_dump / (1 << 20),n_bytes / t_load / (1 << 20),os.path.getsize(path) / (1 << 20)))
+
+
+if __name__ == '__main__':
+    bench()
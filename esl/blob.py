@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+import logging as lg
+
+
+class BlobStore:
+    '''
+        content-addressed store shared by the clusters under the same root directory.
+        a blob is named by the content fingerprint and the file extension of a data, and cluster files are
+        hard links of the blobs (or copies if linking is not supported). blobs are referenced by the
+        'blob' field in the cluster info, unreferenced blobs are deleted by gc().
+    '''
+    __DIR__ = '.blobs'
+
+    def __init__(self,root_dir):
+        self.root_dir = root_dir
+        self.blob_dir = os.path.join(root_dir,self.__class__.__DIR__)
+
+    def path(self,blob_key):
+        return os.path.join(self.blob_dir,blob_key[:2],blob_key)
+
+    def exists(self,blob_key):
+        return os.path.isfile(self.path(blob_key))
+
+    def put(self,blob_key,src_path):
+        '''
+            add a written cluster file to the store.
+        '''
+        blob_path = self.path(blob_key)
+        if os.path.isfile(blob_path):
+            return
+        os.makedirs(os.path.dirname(blob_path),exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(blob_path,os.getpid())
+        try:
+            os.link(src_path,tmp_path)
+        except OSError:
+            shutil.copyfile(src_path,tmp_path)
+        os.replace(tmp_path,blob_path)
+
+    def link(self,blob_key,dst_path):
+        '''
+            materialize a blob at a cluster file path without rewriting its content.
+        '''
+        tmp_path = '{}.{}.tmp'.format(dst_path,os.getpid())
+        try:
+            os.link(self.path(blob_key),tmp_path)
+        except OSError:
+            shutil.copyfile(self.path(blob_key),tmp_path)
+        os.replace(tmp_path,dst_path)
+
+    def referenced_keys(self):
+        '''
+            blob keys referenced by the cluster info of all clusters under the root directory.
+        '''
+        keys = set()
+        for cluster_id in os.listdir(self.root_dir):
+            info_path = os.path.join(self.root_dir,cluster_id,'info.json')
+            if not os.path.isfile(info_path):
+                continue
+            try:
+                with open(info_path,'r') as f:
+                    cluster_info = json.load(f)
+            except (IOError,ValueError):
+                lg.error('ESL blob store stops at the unreadable cluster info {}, no blob is deleted.'.format(info_path))
+                raise IOError
+            for data_type in cluster_info:
+                for meta in cluster_info[data_type].values():
+                    if isinstance(meta,dict) and 'blob' in meta:
+                        keys.add(meta['blob'])
+        return keys
+
+    def gc(self):
+        '''
+            delete the blobs not referenced by any cluster, return (number of blobs, bytes) removed.
+        '''
+        if not os.path.isdir(self.blob_dir):
+            return 0,0
+        keys = self.referenced_keys()
+        n_blob,n_bytes = 0,0
+        for sub_dir in os.listdir(self.blob_dir):
+            for blob_key in os.listdir(os.path.join(self.blob_dir,sub_dir)):
+                if blob_key in keys or blob_key.endswith('.tmp'):
+                    continue
+                blob_path = os.path.join(self.blob_dir,sub_dir,blob_key)
+                n_bytes += os.path.getsize(blob_path)
+                os.remove(blob_path)
+                n_blob += 1
+        return n_blob,n_bytes
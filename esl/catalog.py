@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging as lg
+
+
+class Catalog:
+    '''
+        index of the clusters under a root directory in a sqlite database in WAL mode:
+        cluster ids, types, names, timestamps, sizes and entry listings, with indexed lookups and inserts
+        that are safe for concurrent processes. the desc.json of the former versions is migrated on opening.
+    '''
+    __DB__ = 'catalog.db'
+    __DESC__ = 'desc.json'
+
+    def __init__(self,root_dir):
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root_dir,self.__class__.__DB__),timeout=60,
+                                    isolation_level=None,check_same_thread=False)
+        with self._lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS clusters (cluster_id TEXT PRIMARY KEY, cluster_type TEXT, '
+                              'cluster_name TEXT, ctime REAL, mtime REAL, n_entries INTEGER DEFAULT 0, disk_bytes INTEGER DEFAULT 0)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS clusters_type ON clusters (cluster_type)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS entries (cluster_id TEXT, save_name TEXT, data_type TEXT, '
+                              'path TEXT, size INTEGER, PRIMARY KEY (cluster_id, save_name))')
+        self._migrate()
+
+    def _migrate(self):
+        desc_file = os.path.join(self.root_dir,self.__class__.__DESC__)
+        if not os.path.exists(desc_file):
+            return
+        try:
+            with open(desc_file,'r') as f:
+                cluster_ids = list(json.load(f))
+        except (IOError,ValueError):
+            lg.warning('ESL skips migrating the destroyed {}'.format(desc_file))
+            return
+        for cluster_id in cluster_ids:
+            self.add(cluster_id)
+        try:
+            os.replace(desc_file,desc_file + '.migrated')
+        except FileNotFoundError:
+            pass # migrated by another process.
+
+    def add(self,cluster_id):
+        '''
+            register a cluster id of the form "type@name", nothing happens if it exists.
+        '''
+        cluster_type,_,cluster_name = cluster_id.partition('@')
+        cur_time = time.time()
+        with self._lock:
+            self.conn.execute('INSERT OR IGNORE INTO clusters (cluster_id, cluster_type, cluster_name, ctime, mtime) '
+                              'VALUES (?, ?, ?, ?, ?)',(cluster_id,cluster_type,cluster_name,cur_time,cur_time))
+
+    def exists(self,cluster_id):
+        with self._lock:
+            return self.conn.execute('SELECT 1 FROM clusters WHERE cluster_id = ?',(cluster_id,)).fetchone() is not None
+
+    def update(self,cluster_id,cluster_info):
+        '''
+            replace the entry listing and the size of a cluster by its cluster info in one transaction.
+        '''
+        rows = [(cluster_id,save_name,data_type,meta.get('path'),meta.get('size'))
+                for data_type in cluster_info for save_name,meta in cluster_info[data_type].items()]
+        cluster_type,_,cluster_name = cluster_id.partition('@')
+        cur_time = time.time()
+        with self._lock:
+            try:
+                self.conn.execute('BEGIN IMMEDIATE')
+                self.conn.execute('INSERT OR IGNORE INTO clusters (cluster_id, cluster_type, cluster_name, ctime, mtime) '
+                                  'VALUES (?, ?, ?, ?, ?)',(cluster_id,cluster_type,cluster_name,cur_time,cur_time))
+                self.conn.execute('DELETE FROM entries WHERE cluster_id = ?',(cluster_id,))
+                self.conn.executemany('INSERT INTO entries VALUES (?, ?, ?, ?, ?)',rows)
+                self.conn.execute('UPDATE clusters SET mtime = ?, n_entries = ?, disk_bytes = ? WHERE cluster_id = ?',
+                                  (cur_time,len(rows),sum(row[4] or 0 for row in rows),cluster_id))
+                self.conn.execute('COMMIT')
+            except sqlite3.Error:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def clusters(self,cluster_type=None):
+        '''
+            summary dicts of the clusters, of a type if given.
+        '''
+        sql = 'SELECT cluster_id, cluster_type, cluster_name, ctime, mtime, n_entries, disk_bytes FROM clusters'
+        with self._lock:
+            if cluster_type is None:
+                rows = self.conn.execute(sql + ' ORDER BY cluster_id').fetchall()
+            else:
+                rows = self.conn.execute(sql + ' WHERE cluster_type = ? ORDER BY cluster_id',(cluster_type,)).fetchall()
+        keys = ['cluster_id','cluster_type','cluster_name','ctime','mtime','n_entries','disk_bytes']
+        return [dict(zip(keys,row)) for row in rows]
+
+    def entries(self,cluster_id):
+        with self._lock:
+            rows = self.conn.execute('SELECT save_name, data_type, path, size FROM entries WHERE cluster_id = ? '
+                                     'ORDER BY save_name',(cluster_id,)).fetchall()
+        return [dict(zip(['save_name','data_type','path','size'],row)) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
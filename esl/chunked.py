@@ -0,0 +1,290 @@
+import os
+import json
+import shutil
+import itertools
+import threading
+import logging as lg
+import esl.util as util
+from esl.codec import Codec
+np = util.lazy_import('numpy')
+
+
+class ChunkedArray:
+    '''
+        n-d array stored on the disk as a fixed grid of chunks plus a manifest, e.g. embedding tables larger than the memory.
+        slicing only reads the chunks it touches, item assignment and append() only rewrite the chunks they touch.
+        each chunk file holds the chunk rows in use (padded with fill_value at the other edges), optionally compressed,
+        and missing chunks or rows read as fill_value.
+    '''
+    __MANIFEST__ = 'manifest.json'
+    __CHUNK_BYTES__ = 1 << 20 # default target size of a chunk.
+
+    def __init__(self,path):
+        self.path = path
+        self._lock = threading.RLock()
+        try:
+            with open(os.path.join(path,self.__class__.__MANIFEST__),'r') as f:
+                manifest = json.load(f)
+        except (IOError,ValueError):
+            lg.warning('ESL chunked array {} destroyed, manifest unreadable.'.format(path))
+            raise IOError
+        self.shape = tuple(manifest['shape'])
+        self.dtype = np.dtype(manifest['dtype'])
+        self.chunks = tuple(manifest['chunks'])
+        self.compressor = manifest['compressor']
+        self.fill_value = manifest['fill_value']
+
+    @classmethod
+    def create(cls,path,shape,dtype,chunks=None,compressor=None,fill_value=0):
+        '''
+            create an empty chunked array at the directory path, an existing one is replaced.
+        :param chunks: chunk shape, by default whole rows of about 1 MB along the first axis.
+        :param compressor: None or a codec name, e.g. 'zlib' or 'zstd'.
+        '''
+        shape,dtype = tuple(int(dim) for dim in shape),np.dtype(dtype)
+        if len(shape) == 0 or dtype.hasobject:
+            lg.error('ESL chunked arrays need at least one dimension and a non-object dtype, got shape {} dtype {}'.format(shape,dtype))
+            raise ValueError
+        if chunks is None:
+            chunks = cls.default_chunks(shape,dtype,n_row=max(shape[0],1))
+        chunks = tuple(max(1,int(dim)) for dim in chunks)
+        if len(chunks) != len(shape):
+            lg.error('ESL chunk shape {} does not match the array shape {}'.format(chunks,shape))
+            raise ValueError
+        if Codec.check(compressor) == 'auto':
+            lg.error('ESL chunked arrays need a fixed compressor, got "auto".')
+            raise ValueError
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        cls._write_manifest(path,{'shape':list(shape),'dtype':dtype.str,'chunks':list(chunks),
+                                  'compressor':compressor,'fill_value':fill_value})
+        return cls(path)
+
+    @classmethod
+    def default_chunks(cls,shape,dtype,n_row=None):
+        '''
+            whole rows of about 1 MB along the first axis, at most n_row rows if given.
+        '''
+        row_bytes = np.dtype(dtype).itemsize
+        for dim in shape[1:]:
+            row_bytes *= int(dim)
+        n_chunk_row = max(1,cls.__CHUNK_BYTES__ // max(row_bytes,1))
+        return (n_chunk_row if n_row is None else max(1,min(n_row,n_chunk_row)),) + tuple(int(dim) for dim in shape[1:])
+
+    @classmethod
+    def from_array(cls,path,data,chunks=None,compressor=None):
+        '''
+            create a chunked array from an array (or a memory map) written block by block along the first axis.
+        '''
+        array = cls.create(path,data.shape,data.dtype,chunks=chunks,compressor=compressor)
+        for st in range(0,data.shape[0],array.chunks[0]):
+            array[st:st + array.chunks[0]] = data[st:st + array.chunks[0]]
+        return array
+
+    @classmethod
+    def _write_manifest(cls,path,manifest):
+        tmp_path = os.path.join(path,cls.__MANIFEST__ + '.tmp')
+        with open(tmp_path,'w') as f:
+            json.dump(manifest,f)
+        os.replace(tmp_path,os.path.join(path,cls.__MANIFEST__))
+
+    def flush(self):
+        with self._lock:
+            self._write_manifest(self.path,{'shape':list(self.shape),'dtype':self.dtype.str,'chunks':list(self.chunks),
+                                            'compressor':self.compressor,'fill_value':self.fill_value})
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        size = 1
+        for dim in self.shape:
+            size *= dim
+        return size
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return 'ChunkedArray(shape={}, dtype={}, chunks={}, path={})'.format(self.shape,self.dtype,self.chunks,self.path)
+
+    def __reduce__(self):
+        return self.__class__,(self.path,)
+
+    def __array__(self,dtype=None,copy=None):
+        data = self[...]
+        return data if dtype is None else data.astype(dtype)
+
+    def chunk_path(self,chunk_idx):
+        return os.path.join(self.path,'c' + '.'.join(str(idx) for idx in chunk_idx))
+
+    def _chunk_row_bytes(self):
+        row_bytes = self.dtype.itemsize
+        for dim in self.chunks[1:]:
+            row_bytes *= dim
+        return row_bytes
+
+    def _read_chunk(self,chunk_idx):
+        try:
+            with open(self.chunk_path(chunk_idx),'rb') as f:
+                buf = f.read()
+        except FileNotFoundError:
+            return np.full(self.chunks,self.fill_value,dtype=self.dtype)
+        if self.compressor is not None:
+            buf = Codec.decompress(self.compressor,buf)
+        n_row = min(self.chunks[0],len(buf) // self._chunk_row_bytes())
+        if n_row == self.chunks[0]:
+            return np.frombuffer(buf,dtype=self.dtype,count=self.chunks[0] * self._chunk_row_bytes() // self.dtype.itemsize).reshape(self.chunks)
+        chunk = np.full(self.chunks,self.fill_value,dtype=self.dtype)
+        chunk[:n_row] = np.frombuffer(buf,dtype=self.dtype,count=n_row * self._chunk_row_bytes() // self.dtype.itemsize).reshape((n_row,) + self.chunks[1:])
+        return chunk
+
+    def _write_chunk(self,chunk_idx,chunk,n_row=None):
+        # only the first n_row rows are stored, e.g. the last chunk along the first axis.
+        buf = np.ascontiguousarray(chunk[:n_row],dtype=self.dtype).tobytes()
+        if self.compressor is not None:
+            buf = Codec.compress(self.compressor,buf)
+        tmp_path = '{}.{}.tmp'.format(self.chunk_path(chunk_idx),threading.get_ident())
+        with open(tmp_path,'wb') as f:
+            f.write(buf)
+        os.replace(tmp_path,self.chunk_path(chunk_idx)) # readers never see a partial chunk.
+
+    def _selection(self,key,shape):
+        '''
+            indices selected along each axis by basic indexing (ints, slices, Ellipsis) or a single integer / bool array,
+            and the axes dropped from the result by int keys.
+        '''
+        key = key if isinstance(key,tuple) else (key,)
+        ellipsis_pos = [idx for idx,ele in enumerate(key) if ele is Ellipsis]
+        if len(ellipsis_pos) > 1:
+            raise IndexError('an index can only have a single ellipsis')
+        elif len(ellipsis_pos) == 1:
+            pos = ellipsis_pos[0]
+            key = key[:pos] + (slice(None),) * (len(shape) - len(key) + 1) + key[pos + 1:]
+        if len(key) > len(shape):
+            raise IndexError('too many indices for chunked array of {} dimensions'.format(len(shape)))
+        key = key + (slice(None),) * (len(shape) - len(key))
+        selection,dropped,n_array = [],[],0
+        for axis,(ele,dim) in enumerate(zip(key,shape)):
+            if isinstance(ele,slice):
+                selection.append(np.arange(*ele.indices(dim)))
+            elif isinstance(ele,(int,np.integer)):
+                if not -dim <= ele < dim:
+                    raise IndexError('index {} is out of bounds for axis {} with size {}'.format(ele,axis,dim))
+                selection.append(np.array([ele % dim]))
+                dropped.append(axis)
+            elif ele is None:
+                raise IndexError('chunked arrays do not support new axes')
+            else:
+                indices = np.asarray(ele)
+                if indices.dtype == bool:
+                    indices = np.nonzero(indices)[0]
+                if indices.ndim != 1 or indices.dtype.kind not in 'iu':
+                    raise IndexError('only 1-d integer or bool arrays are valid indices of chunked arrays')
+                if np.any(indices >= dim) or np.any(indices < -dim):
+                    raise IndexError('index out of bounds for axis {} with size {}'.format(axis,dim))
+                selection.append(indices % dim)
+                n_array += 1
+        if n_array > 1:
+            raise IndexError('chunked arrays support at most one array index')
+        return selection,dropped
+
+    def _groups(self,selection):
+        # per axis: [(chunk id, positions in the result, positions in the chunk)], as slices where contiguous.
+        groups = []
+        for indices,chunk in zip(selection,self.chunks):
+            chunk_ids = indices // chunk
+            axis_groups = []
+            for chunk_id in np.unique(chunk_ids):
+                pos = np.nonzero(chunk_ids == chunk_id)[0]
+                axis_groups.append((int(chunk_id),_as_slice(pos),_as_slice(indices[pos] - chunk_id * chunk)))
+            groups.append(axis_groups)
+        return groups
+
+    def __getitem__(self,key):
+        selection,dropped = self._selection(key,self.shape)
+        out = np.empty([len(indices) for indices in selection],dtype=self.dtype)
+        for combo in itertools.product(*self._groups(selection)):
+            chunk = self._read_chunk([group[0] for group in combo])
+            out[_index([group[1] for group in combo])] = chunk[_index([group[2] for group in combo])]
+        return out.reshape([len(indices) for axis,indices in enumerate(selection) if axis not in dropped])
+
+    def __setitem__(self,key,value):
+        with self._lock:
+            self._write(key,value,self.shape)
+
+    def _write(self,key,value,shape):
+        selection,dropped = self._selection(key,shape)
+        out_shape = [len(indices) for indices in selection]
+        value = np.asarray(value,dtype=self.dtype)
+        value = np.broadcast_to(value,[dim for axis,dim in enumerate(out_shape) if axis not in dropped]).reshape(out_shape)
+        for combo in itertools.product(*self._groups(selection)):
+            chunk_idx = [group[0] for group in combo]
+            chunk = self._read_chunk(chunk_idx).copy()
+            chunk[_index([group[2] for group in combo])] = value[_index([group[1] for group in combo])]
+            self._write_chunk(chunk_idx,chunk,n_row=min(self.chunks[0],shape[0] - chunk_idx[0] * self.chunks[0]))
+
+    def append(self,values):
+        '''
+            append rows along the first axis, only the last partial chunk and the new chunks are written.
+        '''
+        values = np.asarray(values,dtype=self.dtype)
+        if values.ndim != self.ndim or tuple(values.shape[1:]) != self.shape[1:]:
+            lg.error('ESL can not append rows of shape {} to the chunked array of shape {}'.format(values.shape,self.shape))
+            raise ValueError
+        with self._lock:
+            n_row = self.shape[0]
+            new_shape = (n_row + values.shape[0],) + self.shape[1:]
+            n_fast = self._append_in_place(values)
+            self._write(slice(n_row + n_fast,new_shape[0]),values[n_fast:],new_shape)
+            self.shape = new_shape # visible only after the chunks are written.
+            self.flush()
+        return self
+
+    def _append_in_place(self,values):
+        '''
+            append raw rows to the end of the last partial chunk file if it spans the whole rows and is not compressed,
+            return the number of rows written. rows beyond the manifest shape of an interrupted append are never read.
+        '''
+        if self.compressor is not None or self.chunks[1:] != self.shape[1:] or 0 in self.shape[1:]:
+            return 0
+        chunk_id,offset = divmod(self.shape[0],self.chunks[0])
+        chunk_path = self.chunk_path((chunk_id,) + (0,) * (self.ndim - 1))
+        if offset == 0 or not os.path.isfile(chunk_path) or os.path.getsize(chunk_path) != offset * self._chunk_row_bytes():
+            return 0
+        n_fast = min(self.chunks[0] - offset,values.shape[0])
+        with open(chunk_path,'ab') as f:
+            f.write(np.ascontiguousarray(values[:n_fast]).tobytes())
+        return n_fast
+
+    def iter_chunks(self):
+        '''
+            yield the array block by block along the first axis, a chunk row at a time.
+        '''
+        for st in range(0,self.shape[0],self.chunks[0]):
+            yield self[st:st + self.chunks[0]]
+
+    def copy_to(self,path):
+        with self._lock:
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            shutil.copytree(self.path,path)
+        return self.__class__(path)
+
+
+def _as_slice(indices):
+    if len(indices) > 0 and indices[-1] - indices[0] == len(indices) - 1 and np.all(np.diff(indices) == 1):
+        return slice(int(indices[0]),int(indices[-1]) + 1)
+    return indices
+
+def _index(keys):
+    if all(isinstance(key,slice) for key in keys):
+        return tuple(keys)
+    return np.ix_(*[np.arange(key.start,key.stop) if isinstance(key,slice) else key for key in keys])
@@ -0,0 +1,133 @@
+import bz2
+import lzma
+import time
+import zlib
+import logging as lg
+import esl.util as util
+
+
+class Codec:
+    '''
+        byte compression of stored data: zlib, lzma and bz2 of the stdlib, and zstd / lz4 if installed.
+        the codec of a data is recorded in its meta, so loading needs no configuration.
+        'auto' picks the codec and fast level of the least estimated cost (compressing, decompressing, writing and
+        reading back at __BANDWIDTH__ bytes/s) on a small sample of the payload, or no codec if none pays off.
+    '''
+    __BANDWIDTH__ = 100 * (1 << 20) # assumed i/o bandwidth, e.g. a network file system.
+    __FAST_LEVELS__ = {'zlib':1,'lzma':0,'bz2':1,'zstd':1,'lz4':0}
+    __LEVELS__ = {'zlib':(0,9),'lzma':(0,9),'bz2':(1,9),'zstd':(1,22),'lz4':(0,16)} # (min, max) level of each codec.
+    __SAMPLE__ = 1 << 16 # bytes of each of the sampled slices.
+    __N_SAMPLE__ = 4
+    __MIN_RATIO__ = 1.1 # compression ratio below which data is stored raw.
+
+    @classmethod
+    def names(cls):
+        return ['zlib','lzma','bz2','zstd','lz4']
+
+    @classmethod
+    def is_available(cls,name):
+        if name == 'zstd':
+            return util.is_module_available('zstandard')
+        elif name == 'lz4':
+            return util.is_module_available('lz4')
+        return name in cls.names()
+
+    @classmethod
+    def check(cls,name):
+        '''
+            validate a codec name, None or 'auto' included.
+        '''
+        if name is None or name == 'auto':
+            return name
+        if name not in cls.names():
+            lg.error('ESL encounter unknown codec {}, use one of {} or "auto".'.format(name,cls.names()))
+            raise ValueError
+        if not cls.is_available(name):
+            lg.error('ESL codec {} is not installed, plz install {}.'.format(name,'zstandard' if name == 'zstd' else name))
+            raise ImportError
+        return name
+
+    @classmethod
+    def is_level(cls,name,level):
+        '''
+            whether codec name takes the compression level, None (its default) included.
+        '''
+        if level is None:
+            return True
+        low,high = cls.__LEVELS__[name]
+        return isinstance(level,int) and not isinstance(level,bool) and low <= level <= high
+
+    @classmethod
+    def check_level(cls,name,level):
+        '''
+            validate the level of a codec name, for 'auto' at least one of the available codecs must take it.
+        '''
+        if name is None:
+            return level
+        names = [name_ for name_ in cls.names() if cls.is_available(name_)] if name == 'auto' else [name]
+        if not any(cls.is_level(name_,level) for name_ in names):
+            lg.error('ESL encounter invalid level {} of codec {}, the levels are {}.'.format(
+                level,name,', '.join('{} {}-{}'.format(name_,*cls.__LEVELS__[name_]) for name_ in names)))
+            raise ValueError
+        return level
+
+    @classmethod
+    def compress(cls,name,buf,level=None):
+        if name == 'zlib':
+            return zlib.compress(buf,6 if level is None else level)
+        elif name == 'lzma':
+            return lzma.compress(buf,preset=6 if level is None else level)
+        elif name == 'bz2':
+            return bz2.compress(buf,compresslevel=9 if level is None else level)
+        elif name == 'zstd':
+            zstandard = util.lazy_import('zstandard')
+            return zstandard.ZstdCompressor(level=3 if level is None else level).compress(buf)
+        elif name == 'lz4':
+            lz4_frame = util.lazy_import('lz4.frame')
+            return lz4_frame.compress(buf,compression_level=0 if level is None else level)
+        lg.error('ESL encounter unknown codec {}'.format(name))
+        raise ValueError
+
+    @classmethod
+    def decompress(cls,name,buf):
+        if name == 'zlib':
+            return zlib.decompress(buf)
+        elif name == 'lzma':
+            return lzma.decompress(buf)
+        elif name == 'bz2':
+            return bz2.decompress(buf)
+        elif name == 'zstd':
+            return util.lazy_import('zstandard').ZstdDecompressor().decompress(buf)
+        elif name == 'lz4':
+            return util.lazy_import('lz4.frame').decompress(buf)
+        lg.error('ESL encounter unknown codec {}'.format(name))
+        raise ValueError
+
+    @classmethod
+    def sample(cls,buf):
+        if len(buf) <= cls.__SAMPLE__ * cls.__N_SAMPLE__:
+            return bytes(buf)
+        step = (len(buf) - cls.__SAMPLE__) // (cls.__N_SAMPLE__ - 1)
+        return b''.join(bytes(buf[idx * step:idx * step + cls.__SAMPLE__]) for idx in range(cls.__N_SAMPLE__))
+
+    @classmethod
+    def choose(cls,buf,level=None):
+        '''
+            (codec, level) of the least estimated cost on a sample of buf, (None, None) to store it raw.
+        :param level: level of all the codecs tried, None for their fast levels. codecs not taking it are skipped.
+        '''
+        sample = cls.sample(buf)
+        if len(sample) == 0:
+            return None,None
+        best,best_cost = (None,None),2 * len(sample) / cls.__BANDWIDTH__
+        for name in cls.names():
+            if not cls.is_available(name) or not cls.is_level(name,level):
+                continue
+            name_level = cls.__FAST_LEVELS__[name] if level is None else level
+            st_time = time.perf_counter()
+            compressed = cls.compress(name,sample,name_level)
+            cls.decompress(name,compressed)
+            cost = time.perf_counter() - st_time + 2 * len(compressed) / cls.__BANDWIDTH__
+            if len(sample) / max(len(compressed),1) >= cls.__MIN_RATIO__ and cost < best_cost:
+                best,best_cost = (name,name_level),cost
+        return best
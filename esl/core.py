@@ -1,16 +1,31 @@
-import numpy as np
-import pandas as pd
 import json
-import torch as tc
-import dgl
-import networkx as nx
+import zlib
+import lzma
+import struct
+import pickle
 import logging as lg
 import esl.util as util
 import os
-import copy
+import shutil
+import time
+import atexit
+import threading
+import itertools
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor,ProcessPoolExecutor,as_completed
 from esl.wrapper import *
+from esl.pack import PackFile
+from esl.blob import BlobStore
+from esl.chunked import ChunkedArray
+from esl.codec import Codec
+from esl.catalog import Catalog
+from esl.shared import SharedCluster
+from esl.journal import Journal
+from esl.versions import VersionStore
 from _ctypes import PyObj_FromPtr
 
+logger = lg.getLogger('esl')
 
 class ESL:
     '''
@@ -18,24 +33,115 @@ class ESL:
     '''
     __GLB_ESL_DICT__ = {}
     __ROOT_DIR__ = '.esl_saved'
-    __ROOT_DESC__ = 'desc.json'
-    def __init__(self,cluster_name='global',cluster_type='GLB',load_data=True,force_delete=False,auto_save=True):
+    __CATALOGS__ = {} # (pid, root directory) -> Catalog, a forked child never reuses the connection of its parent.
+    __GLB_MEMORY_BUDGET__ = None
+    __TICKS__ = itertools.count() # access order of the resident data across clusters.
+    __PRUNE_EVERY__ = 64 # new versions between two retention passes, which list all the chunks.
+    def __init__(self,cluster_name='global',cluster_type='GLB',load_data=True,force_delete=False,auto_save=True,lazy_load=False,mmap_mode=None,workers=1,executor='thread',storage='dir',inline_threshold=256,fingerprint=True,verify=False,dedup=False,codec=None,codec_level=None,shared=False,memory_budget=None,journal=False,journal_limit=64 << 20,versioned=False,keep_last=None,keep_every=None,load_options=None):
         '''
         :param cluster_name:
         :param cluster_type: 'GLB' for user, other for extended features.
         :param load_data: if data loaded from storage when construct the cluster.
         :param force_delete: force to deleted destroyed data on the disk.
-        :param auto_save: auto save data when new data is registered.
+        :param auto_save: auto save data when new data is registered, 'async' to save it by the background AsyncWriter.
+        :param lazy_load: only read the cluster info when loading, each data is loaded on its first access.
+        :param mmap_mode: 'r' or 'c' to load numpy data as read-only (or copy-on-write) memory maps and tensors as views on
+            private memory maps, None to read into memory.
+        :param workers: max number of data loaded or dumped concurrently.
+        :param executor: 'thread' or 'process', or a dict from data type to either of them, e.g. {'nx':'process'}.
+        :param storage: 'dir' for a file per data, 'packed' to append the data supporting joint storage into a single pack file.
+        :param inline_threshold: max bytes of small data (inner values, small arrays & tensors) stored inside info.json, 0 to disable.
+        :param fingerprint: record a content hash of each data and skip rewriting the data whose content is unchanged.
+        :param verify: check the content hash of each loaded data besides the cheap size check.
+        :param dedup: store data files in the content-addressed blob store shared by all clusters, requires fingerprint.
+        :param codec: compress the stored data by a codec name (see Codec) or 'auto' to pick one per data,
+            or a dict from data type to either of them, e.g. {'pd':'zstd','np':'auto'}. None to store data raw.
+            dgl graphs are always stored raw, a codec of 'dgl' is rejected.
+        :param codec_level: compression level of the codec, None for its default. it must be in the range of each codec
+            configured (see Codec.__LEVELS__), 'auto' only tries the codecs taking it.
+        :param shared: serve the numpy arrays and tensors from shared memory, the first process sharing the cluster publishes
+            them and the others attach zero-copy views (read-only for arrays), see SharedCluster.
+        :param memory_budget: max approximate bytes of the data held in memory, the least recently used data beyond it is
+            dropped (written first if dirty) and reloaded on its next access. None for no budget, see also set_memory_budget.
+        :param journal: save the registered data by appending it to the write-ahead journal of the cluster with one fsync
+            per commit (see transaction), instead of rewriting its file and the cluster info. the journal is folded into
+            the files by checkpoint(), automatically beyond journal_limit bytes and on close.
+        :param journal_limit: journal bytes that trigger a checkpoint.
+        :param versioned: keep every saved version of the data (except dgl graphs and chunked arrays) as chunk-level deltas,
+            see load(version=...), history and prune_versions.
+        :param keep_last: retention of the versions, keep the latest keep_last versions of each data.
+        :param keep_every: retention of the versions, also keep every keep_every-th version of each data.
+            the retention is applied every __PRUNE_EVERY__ new versions and on close.
+        :param load_options: loading options of single data applied from the first load, a dict from the data name
+            (of a numpy array) or (data type, data name) to the options, e.g. {'feat':{'mmap_mode':'r'}}, see set_load_options.
         '''
         self.cluster_name = cluster_name
         self.cluster_type = cluster_type
         self.cluster_id = self._name2id()
         self.data_dict = None
         self.data2type = None
+        self.cluster_info = None
         self.init_data_dict()
         self.is_load_data = load_data
         self.force_delete = force_delete
         self.auto_save = auto_save
+        self.lazy_load = lazy_load
+        self.mmap_mode = NumpyWrapper.check_mmap_mode(mmap_mode)
+        self.load_options = {}
+        for key,options in (load_options or {}).items():
+            data_type,data_name = key if isinstance(key,tuple) else ('np',key)
+            if data_type not in self.data_types():
+                lg.error('ESL {} encounter unknown data type {} of load options.'.format(self.cluster_id,data_type))
+                raise ValueError
+            if 'mmap_mode' in options:
+                NumpyWrapper.check_mmap_mode(options['mmap_mode'])
+            self.load_options[(data_type,data_name)] = dict(options)
+        self.workers = workers
+        self.executor = executor
+        self._lock = threading.RLock()
+        self.entry_stats = {} # (data type, data name) -> last dump / load seconds.
+        self.storage = storage
+        self.inline_threshold = inline_threshold
+        self.fingerprint = fingerprint
+        self.verify = verify
+        self.dedup = dedup
+        self.codec = codec
+        self.codec_level = codec_level
+        self.shared = shared
+        self._shared_cluster = None
+        self._shared_keys = set()
+        self.memory_budget = memory_budget
+        self._resident = OrderedDict() # (data type, data name) -> [bytes, access tick] of the data held, least recent first.
+        self._resident_bytes = 0
+        self.cache_stats = {'hits':0,'misses':0,'evictions':0,'evicted_bytes':0,'flushes':0}
+        self.journal_limit = journal_limit
+        self._journal = None
+        self._journaled = set() # (data type, data name) of the data whose latest version is only in the journal.
+        self._txn_depth = 0
+        self.keep_last = keep_last
+        self.keep_every = keep_every
+        self._versions = None
+        self.version = None # id of the latest version of the cluster if versioned.
+        self._n_unpruned = 0 # new versions since the retention was last applied.
+        self._pack_file = None
+        if shared and not SharedCluster.is_supported():
+            lg.error('ESL {} can not share data on this platform, it needs posix file locks (fcntl).'.format(self.cluster_id))
+            raise ValueError
+        if storage not in ['dir','packed']:
+            lg.error('ESL {} encounter unknown storage {}, use "dir" or "packed".'.format(self.cluster_id,storage))
+            raise ValueError
+        for data_type,codec_name in (codec.items() if isinstance(codec,dict) else [('np',codec)]):
+            if data_type not in self.data_types():
+                lg.error('ESL {} encounter unknown data type {} of codec.'.format(self.cluster_id,data_type))
+                raise ValueError
+            if data_type == 'dgl' and codec_name is not None:
+                lg.error('ESL {} can not compress dgl graphs, they are stored by dgl itself.'.format(self.cluster_id))
+                raise ValueError
+            Codec.check_level(Codec.check(codec_name),codec_level)
+        for kind in (executor.values() if isinstance(executor,dict) else [executor]):
+            if kind not in ['thread','process']:
+                lg.error('ESL {} encounter unknown executor {}, use "thread" or "process".'.format(self.cluster_id,kind))
+                raise ValueError
 
         if self.cluster_id in self.__class__.__GLB_ESL_DICT__ and self.__class__.__GLB_ESL_DICT__[self.cluster_id] != 'Silence':
             lg.error('detect duplicate cluster instance with the same id {}, plz avoid creating an instance of ESL, '
@@ -44,8 +150,18 @@ class ESL:
         ESL.__GLB_ESL_DICT__[self.cluster_id] = self
         if not os.path.exists(self.pwd()):
             os.mkdir(self.pwd())
+        if journal:
+            self._journal = Journal(self.pwd())
+        if versioned:
+            self._versions = VersionStore(self.pwd())
+            self.version = self._versions.head()
         if load_data:
-            if not self.load():
+            try:
+                is_loaded = self.load()
+            except Exception:
+                ESL.__GLB_ESL_DICT__.pop(self.cluster_id,None) # never left half constructed.
+                raise
+            if not is_loaded:
                 if not self.force_delete:
                     lg.error('ESL {} failed to load some of the data, use option "force_delete=True" to recover.'.format(self.cluster_id))
                     raise IOError
@@ -53,6 +169,8 @@ class ESL:
                     self.dump()
             else:
                 self._construct_data2type_dict()
+            if shared:
+                self._attach_shared()
 
     def _construct_data2type_dict(self):
         if self.data_dict is None:
@@ -67,6 +185,7 @@ class ESL:
                     self.data2type[data_name].append(type)
 
     def init_data_dict(self):
+        self.cluster_info = {data_type:{} for data_type in self.data_types()} # save name -> meta of data on disk.
         self.data_dict = {}
         self.data_dict['inn'] = {}
         self.data_dict['np'] = {}
@@ -80,62 +199,55 @@ class ESL:
         if save_path is not None:
             cls.__ROOT_DIR__ = os.path.join(save_path,'.esl_saved')
         if not os.path.exists(cls.__ROOT_DIR__):
-            os.mkdir(cls.__ROOT_DIR__)
-        desc_file = os.path.join(cls.__ROOT_DIR__, cls.__ROOT_DESC__)
-        if not os.path.exists(desc_file):
-            with open(desc_file,'w') as f:
-                json.dump(cls.__GLB_ESL_DICT__,f)
+            os.makedirs(cls.__ROOT_DIR__,exist_ok=True)
+        cls.catalog() # opening the catalog migrates the desc.json of former versions.
+
+    @classmethod
+    def catalog(cls):
+        '''
+            the cluster catalog of the current root directory, shared by the instances of this process.
+        '''
+        key = (os.getpid(),os.path.abspath(cls.__ROOT_DIR__))
+        if key not in cls.__CATALOGS__: # the ones inherited by fork are kept, closing them would drop the locks of the parent.
+            os.makedirs(key[1],exist_ok=True)
+            cls.__CATALOGS__[key] = Catalog(key[1])
+        return cls.__CATALOGS__[key]
+
+    @classmethod
+    def clusters(cls,cluster_type=None):
+        '''
+            summaries of the clusters stored under the root directory, see Catalog.clusters.
+        :param cluster_type: only the clusters of this type, e.g. 'GLB' or 'FUNC'.
+        '''
+        cls.config_meta_path()
+        return cls.catalog().clusters(cluster_type)
 
     @classmethod
     def update_meta_info(cls,is_read=True,is_write=True):
-        desc_file = os.path.join(cls.__ROOT_DIR__, cls.__ROOT_DESC__)
-        if is_read:
-            if not os.path.exists(desc_file):
-                load_dict = {}
-            else:
-                try:
-                    with open(desc_file, 'r') as f:
-                        load_dict = json.load(f)
-                except IOError:
-                    lg.warning('ESL Storage destroyed or during constructing a new repository.')
-                    load_dict = {}
-        else:
-            load_dict = {}
+        '''
+            sync the cluster ids of this process with the catalog: register the live clusters when writing,
+            and mark the stored clusters not alive in this process as 'Silence' when reading.
+        '''
+        catalog = cls.catalog()
         if is_write:
-            load_dict.update(cls.__GLB_ESL_DICT__)
-            cls.__GLB_ESL_DICT__ = copy.deepcopy(load_dict)
-            for k in load_dict:
-                load_dict[k] = 'Silence'
-            with open(desc_file, 'w') as f:
-                json.dump(load_dict, f)
-        else:
-            cls.__GLB_ESL_DICT__ = load_dict
+            for cluster_id,esl in list(cls.__GLB_ESL_DICT__.items()):
+                if esl != 'Silence':
+                    catalog.add(cluster_id)
+        if is_read:
+            for item in catalog.clusters():
+                cls.__GLB_ESL_DICT__.setdefault(item['cluster_id'],'Silence')
 
     @classmethod
     def from_cluster(cls,cluster_name='global',cluster_type='GLB',**kwargs):
         cls.config_meta_path()
         intend_id = cls._s_name2id(cluster_name,cluster_type)
-
-        if intend_id in cls.__GLB_ESL_DICT__:
-            # pre-search.
-            if cls.__GLB_ESL_DICT__[intend_id] != 'Silence':
-                return cls.__GLB_ESL_DICT__[intend_id]
-            else:
-                esl = ESL(cluster_name=cluster_name,cluster_type=cluster_type,**kwargs)
-                assert cls.__GLB_ESL_DICT__[intend_id] != 'Silence' # acitivate!
-                return esl
-        else:
-            cls.update_meta_info(is_write=False)
-            if intend_id in cls.__GLB_ESL_DICT__:
-                assert cls.__GLB_ESL_DICT__[intend_id] == 'Silence'
-                esl = ESL(cluster_name=cluster_name,cluster_type=cluster_type,**kwargs)
-                assert cls.__GLB_ESL_DICT__[intend_id] != 'Silence'  # acitivate!
-                return esl
-            else:
-                esl = ESL(cluster_name=cluster_name, cluster_type=cluster_type,**kwargs)
-                assert intend_id in cls.__GLB_ESL_DICT__ and cls.__GLB_ESL_DICT__[intend_id] != 'Silence'  # acitivate!
-                cls.update_meta_info(is_write=True)
-                return esl
+        esl = cls.__GLB_ESL_DICT__.get(intend_id)
+        if esl is not None and esl != 'Silence':
+            return esl
+        esl = ESL(cluster_name=cluster_name,cluster_type=cluster_type,**kwargs)
+        assert cls.__GLB_ESL_DICT__[intend_id] is esl # acitivate!
+        cls.catalog().add(intend_id)
+        return esl
 
     @classmethod
     def from_func(cls,func,**kwargs):
@@ -157,22 +269,33 @@ class ESL:
     def __str__(self):
         return self.cluster_id
 
-    def _check_data_type(self,data):
-        if type(data) in [int,float,str,list,dict,set,]:
+    @classmethod
+    def _s_data_type(cls,data):
+        '''
+            type check without importing the backends, None for unknown types.
+        '''
+        if TorchWrapper.is_tensor_dict(data): # state_dict-style.
+            return 'tc'
+        elif type(data) in [int,float,bool,str,bytes,list,dict,set,frozenset,tuple,type(None)]:
             return 'inn'
-        elif type(data) is np.ndarray:
+        elif util.check_type(data,'numpy','ndarray') or isinstance(data,ChunkedArray): # np.memmap included.
             return 'np'
-        elif type(data) is pd.DataFrame:
+        elif util.check_type(data,'pandas','DataFrame',exact=True):
             return 'pd'
-        elif type(data) is dgl.DGLGraph:
+        elif util.check_type(data,'dgl','DGLGraph',exact=True):
             return 'dgl'
-        elif type(data) is nx.Graph:
+        elif util.check_type(data,'networkx','Graph'): # directed and multi-graphs included.
             return 'nx'
-        elif type(data) is tc.Tensor:
+        elif util.check_type(data,'torch','Tensor',exact=True):
             return 'tc'
-        else:
+        return None
+
+    def _check_data_type(self,data):
+        data_type = self._s_data_type(data)
+        if data_type is None:
             lg.error('ESL encounter unknown data type {}'.format(type(data)))
             raise TypeError
+        return data_type
 
     def register(self, **dict_data):
         '''
@@ -180,24 +303,175 @@ class ESL:
         '''
         for data_name in dict_data:
             data = dict_data[data_name]
-            if type(data) in [int, float, str, list, dict, set,tuple]:
-                self.data_dict['inn'][data_name] = (data,False)
-            elif type(data) is np.ndarray:
-                self.data_dict['np'][data_name] = (data,False)
-            elif type(data) is pd.DataFrame:
-                self.data_dict['pd'][data_name] = (data,False)
-            elif type(data) is dgl.DGLGraph:
-                self.data_dict['dgl'][data_name] = (data,False)
-            elif type(data) is nx.Graph:
-                self.data_dict['nx'][data_name] = (data,False)
-            elif type(data) is tc.Tensor:
-                self.data_dict['tc'][data_name] = (data,False)
-            else:
+            data_type = self._s_data_type(data)
+            if data_type is None:
                 lg.error('ESL encountered unknown data type {}, named as {}'.format(type(data),data_name))
                 raise TypeError
-        if self.auto_save:
+            self.data_dict[data_type][data_name] = (data,False)
+        if self._txn_depth > 0:
+            pass # committed at the end of the transaction.
+        elif self.auto_save == 'async' and self._journal is None:
+            self.dump_async(*dict_data.keys())
+        elif self.auto_save:
             self.dump()
-        print(f'{self} all:{self.data_dict}')
+        if self._is_budgeted():
+            for data_name in dict_data:
+                self._touch(self._s_data_type(dict_data[data_name]),data_name,is_new=True)
+            self._enforce_budget()
+        if logger.isEnabledFor(lg.DEBUG):
+            logger.debug('ESL %s registered %s',self.cluster_id,list(dict_data.keys()))
+
+    def register_chunked(self,data_name,data=None,shape=None,dtype=None,chunks=None,compressor=None):
+        '''
+            register an on-disk chunked array as a numpy data, empty by shape & dtype, or written from an array / tensor.
+            slicing it, e.g. esl.np().feat[1000:2000,:], only reads the chunks needed, and item assignment or append()
+            write the touched chunks in place, so it can be far larger than the memory.
+        :param chunks: chunk shape, by default whole rows of about 1 MB along the first axis.
+        :param compressor: None or a codec name (see Codec) for each chunk.
+        '''
+        path = os.path.join(self.pwd(),'{}-{}.chunks'.format(NumpyWrapper.type_id(),data_name))
+        with self._lock:
+            if data is None:
+                array = ChunkedArray.create(path,shape,dtype,chunks=chunks,compressor=compressor)
+            else:
+                if util.check_type(data,'torch','Tensor'):
+                    data = data.detach().cpu().numpy()
+                array = ChunkedArray.from_array(path,data,chunks=chunks,compressor=compressor)
+            self.register(**{data_name:array})
+        return array
+
+    def append(self,data_name,batch):
+        '''
+            append a batch to a growing data with O(batch) disk writes instead of rewriting the whole data:
+            items of a list as encoded records, rows of an array (or tensor) to a chunked array, or a data frame as a new part.
+            an existing data of the name is moved into the append-only storage on the first append.
+            the appended data is loaded on its next access, see stream() to read it block by block.
+        '''
+        if util.check_type(batch,'torch','Tensor'):
+            batch = batch.detach().cpu().numpy()
+        data_type = self._check_data_type(batch)
+        if data_type not in ['inn','np','pd'] or (data_type == 'inn' and type(batch) is not list):
+            lg.error('ESL can only append lists, arrays or data frames, got {}'.format(type(batch)))
+            raise TypeError
+        if data_name in self.data_dict[data_type] and not self.data_dict[data_type][data_name][1]:
+            self.flush() # never overwritten later by a pending dump.
+        with self._lock:
+            _wrap_class_ = dict(zip(self.data_types(),self.wrap_classes()))[data_type]
+            save_name = '{}-{}'.format(_wrap_class_.type_id(),data_name)
+            old_meta = self.cluster_info[data_type].get(save_name)
+            is_stream = old_meta is not None and (old_meta.get('stream') or old_meta.get('chunked'))
+            origin = self._fetch(data_type,data_name) if data_name in self.data_dict[data_type] and not is_stream else None
+            if data_type == 'np':
+                meta = {'path':'{}.chunks'.format(save_name),'chunked':True}
+                if is_stream:
+                    array = self._fetch(data_type,data_name)
+                else:
+                    path = os.path.join(self.pwd(),meta['path'])
+                    chunks = ChunkedArray.default_chunks(batch.shape,batch.dtype)
+                    if origin is not None:
+                        array = ChunkedArray.from_array(path,origin,chunks=chunks)
+                    else:
+                        array = ChunkedArray.create(path,(0,) + batch.shape[1:],batch.dtype,chunks=chunks)
+                array.append(batch)
+            elif data_type == 'inn':
+                meta = {'path':'{}.lines'.format(save_name),'stream':True}
+                path = os.path.join(self.pwd(),meta['path'])
+                if is_stream and old_meta['path'] != meta['path']: # json lines of the former versions.
+                    origin = list(InnerWrapper.iter_lines(os.path.join(self.pwd(),old_meta['path'])))
+                if origin is not None: # moved by a new file renamed into place, the old one is kept on failure.
+                    InnerWrapper.write_lines(path,list(origin) + batch)
+                elif is_stream:
+                    InnerWrapper.append_lines(path,batch)
+                else:
+                    InnerWrapper.write_lines(path,batch)
+            else:
+                n_part = old_meta['parts'] if is_stream else 0
+                if origin is not None:
+                    PandasWrapper(data=origin,data_name=data_name,cluster_pwd=self.pwd()).dump_part(n_part)
+                    n_part += 1
+                PandasWrapper(data=batch,data_name=data_name,cluster_pwd=self.pwd()).dump_part(n_part)
+                meta = {'path':'{}.parts'.format(save_name),'stream':True,'parts':n_part + 1}
+            self.data_dict[data_type][data_name] = (array if data_type == 'np' else LazyData(owner=self,data_type=data_type,data_name=data_name),True)
+            self._touch(data_type,data_name,is_new=True)
+            if old_meta != meta:
+                self.cluster_info[data_type][save_name] = meta
+                self._dump_info()
+            if old_meta is not None and old_meta.get('path') != meta['path']:
+                self._remove_stored(save_name,old_meta) # moved into the append-only storage, after the info points to it.
+
+    def stream(self,data_name,data_type=None,batch_size=1024):
+        '''
+            generator over a data block by block without materializing it: lists of batch_size items of appended lists,
+            chunk rows of chunked arrays and the appended parts of data frames, any other data is yielded whole.
+        '''
+        data_types = self.data_types() if data_type is None else [data_type]
+        data_type = [data_type for data_type in data_types if data_name in self.data_dict[data_type]]
+        if len(data_type) == 0:
+            lg.error('ESL {} has no data named {} to stream.'.format(self.cluster_id,data_name))
+            raise KeyError(data_name)
+        data_type = data_type[0]
+        _wrap_class_ = dict(zip(self.data_types(),self.wrap_classes()))[data_type]
+        save_name = '{}-{}'.format(_wrap_class_.type_id(),data_name)
+        meta = self.cluster_info[data_type].get(save_name,{})
+        data,sgn = self.data_dict[data_type][data_name]
+        if not sgn or not (meta.get('stream') or meta.get('chunked')):
+            yield self._fetch(data_type,data_name)
+        elif data_type == 'np':
+            yield from self._fetch(data_type,data_name).iter_chunks()
+        elif data_type == 'inn':
+            items = []
+            for item in InnerWrapper.iter_lines(os.path.join(self.pwd(),meta['path'])):
+                items.append(item)
+                if len(items) >= batch_size:
+                    yield items
+                    items = []
+            if len(items) > 0:
+                yield items
+        else:
+            yield from PandasWrapper.iter_parts(self.pwd(),save_name)
+
+    def mark_dirty(self,*data_names):
+        '''
+            mark registered data as modified so that the next dump rewrites it, e.g. after in-place changes.
+        '''
+        for data_name in data_names:
+            is_found = False
+            for data_type in self.data_types():
+                if data_name in self.data_dict[data_type]:
+                    data,_ = self.data_dict[data_type][data_name]
+                    self.data_dict[data_type][data_name] = (data,False)
+                    is_found = True
+            if not is_found:
+                lg.warning('ESL {} has no data named {} to mark dirty.'.format(self.cluster_id,data_name))
+
+    def remove(self,*data_names):
+        '''
+            remove registered data of all types with the given names from the cluster and the disk.
+        '''
+        with self._lock:
+            removed = []
+            for data_name in data_names:
+                for data_type,_wrap_class_ in zip(self.data_types(),self.wrap_classes()):
+                    if data_name in self.data_dict[data_type]:
+                        removed.append((data_type,data_name))
+                    self.data_dict[data_type].pop(data_name,None)
+                    self._touch(data_type,data_name)
+                    if (data_type,data_name) in self._journaled:
+                        Journal(self.pwd()).commit([(Journal.__DEL__,'{}/{}'.format(data_type,data_name),b'')])
+                        self._journaled.discard((data_type,data_name))
+                    save_name = '{}-{}'.format(_wrap_class_.type_id(),data_name)
+                    meta = self.cluster_info[data_type].pop(save_name,None)
+                    if meta is not None:
+                        self._remove_stored(save_name,meta)
+            self._commit_versions([],removed)
+            self._dump_info()
+
+    def is_dirty(self):
+        for data_type in self.data_types():
+            for data_name in self.data_dict[data_type]:
+                if not self.data_dict[data_type][data_name][1]:
+                    return True
+        return False
 
     @classmethod
     def data_types(cls):
@@ -208,50 +482,682 @@ class ESL:
         return [InnerWrapper,NumpyWrapper,PandasWrapper,TorchWrapper,NetworkXWrapper,DGLWrapper]
 
     def dump(self):
-        _wrap_classes_ = self.__class__.wrap_classes()
-        data_types = self.__class__.data_types()
-        # dump cluster info & modified data.
-        cluster_dict = {}
-        for data_type,_wrap_cls_ in zip(data_types,_wrap_classes_):
-            cluster_dict[data_type] = {}
+        '''
+            write the dirty (newly registered) data and the cluster info, data already on disk is skipped.
+        '''
+        with self._lock:
+            entries = []
+            for data_type in self.data_types():
+                for data_name in self.data_dict[data_type]:
+                    data,sgn = self.data_dict[data_type][data_name]
+                    if not sgn:
+                        entries.append((data_type,data_name,data,data))
+            if self._journal is not None:
+                entries = self._journal_entries(entries) # the cluster info is written only for the rest.
+            if (self._journal is None or len(entries) > 0) and not self._write_entries(entries):
+                raise IOError
+            if self._journal is not None and self._journal.size() > self.journal_limit:
+                self.checkpoint()
+
+    def _journal_entries(self,entries):
+        '''
+            commit the entries supporting joint storage to the journal as one group, return the others to be written.
+        '''
+        _type2wrap_ = dict(zip(self.data_types(),self.wrap_classes()))
+        records,journal_keys,rest = [],[],[]
+        for data_type,data_name,origin,data in entries:
+            wrp = _type2wrap_[data_type](data=data,data_name=data_name,cluster_pwd=self.pwd())
+            if not wrp.is_support_joint() or wrp.is_chunked():
+                rest.append((data_type,data_name,origin,data))
+                continue
+            records.append((Journal.__PUT__,'{}/{}'.format(data_type,data_name),wrp.to_bytes()))
+            journal_keys.append((data_type,data_name,origin))
+        if len(records) > 0:
+            self._journal.commit(records)
+            for data_type,data_name,origin in journal_keys:
+                self._journaled.add((data_type,data_name))
+                if self.data_dict[data_type][data_name][0] is origin:
+                    self.data_dict[data_type][data_name] = (origin,True)
+            self._commit_versions(journal_keys)
+        return rest
+
+    def _commit_versions(self,written,removed=()):
+        '''
+            record the written (data type, data name, data) and the removed (data type, data name) as a new version,
+            then apply the retention every __PRUNE_EVERY__ new versions. the data unchanged since its last version is skipped.
+        '''
+        if self._versions is None:
+            return
+        _type2wrap_ = dict(zip(self.data_types(),self.wrap_classes()))
+        wrps = []
+        for data_type,data_name,data in written:
+            wrp = _type2wrap_[data_type](data=data,data_name=data_name,cluster_pwd=self.pwd())
+            if wrp.is_support_joint() and not wrp.is_chunked():
+                wrps.append((data_type,wrp))
+        version = self._versions.commit(wrps,removed)
+        if version is not None:
+            self.version = version
+            self._n_unpruned += 1
+            if self._n_unpruned >= self.__class__.__PRUNE_EVERY__:
+                self._prune_pending()
+
+    def _prune_pending(self):
+        if self._versions is not None and self._n_unpruned > 0:
+            self._n_unpruned = 0
+            self._versions.prune(self.keep_last,self.keep_every)
+
+    def history(self,data_name,data_type=None):
+        '''
+            versions of a data from the oldest, see VersionStore.history.
+        '''
+        store = VersionStore(self.pwd())
+        for data_type in (self.data_types() if data_type is None else [data_type]):
+            records = store.history(data_type,data_name)
+            if len(records) > 0:
+                return records
+        return []
+
+    def prune_versions(self,keep_last=None,keep_every=None):
+        '''
+            drop the old versions by the retention (the one of the cluster if not given), return the number dropped.
+        '''
+        keep_last = self.keep_last if keep_last is None else keep_last
+        keep_every = self.keep_every if keep_every is None else keep_every
+        return VersionStore(self.pwd()).prune(keep_last,keep_every)
+
+    def _load_version(self,version=None,as_of=None):
+        store = VersionStore(self.pwd())
+        _type2wrap_ = dict(zip(self.data_types(),self.wrap_classes()))
+        dv = DataView()
+        for (data_type,data_name),(_,manifest) in store.state(version,as_of).items():
+            setattr(dv.__getattribute__(data_type),data_name,store.read(_type2wrap_[data_type],data_name,manifest,self.pwd()))
+        return dv
+
+    @contextmanager
+    def transaction(self):
+        '''
+            group the registrations inside the block into a single commit at its end (one fsync with journal=True),
+            e.g. with esl.transaction(): esl.register(a=a); esl.register(b=b).
+            nothing is committed if the block raises, the data registered in it stays dirty in memory.
+        '''
+        self._txn_depth += 1
+        try:
+            yield self
+        finally:
+            self._txn_depth -= 1
+        if self._txn_depth == 0 and self.auto_save:
+            self.dump()
+
+    def checkpoint(self):
+        '''
+            fold the journal into the data files and the cluster info, then drop the journal.
+        '''
+        with self._lock:
+            entries = []
+            for data_type,data_name in self._journaled:
+                if data_name in self.data_dict[data_type]:
+                    data = self.data_dict[data_type][data_name][0]
+                    entries.append((data_type,data_name,data,data))
+            if not self._write_entries(entries,sync=True):
+                raise IOError # the journal is kept, it is the only durable copy.
+            self._journaled.clear()
+            Journal(self.pwd()).reset()
+
+    def dump_async(self,*data_names):
+        '''
+            hand snapshots of the dirty data (all of them if no name given) over to the background writer and return immediately.
+        '''
+        writer = AsyncWriter.default()
+        _type2wrap_ = dict(zip(self.data_types(),self.wrap_classes()))
+        for data_type in self.data_types():
             for data_name in self.data_dict[data_type]:
+                if len(data_names) > 0 and data_name not in data_names:
+                    continue
                 data,sgn = self.data_dict[data_type][data_name]
-                wrp = _wrap_cls_(data=data, data_name=data_name,cluster_pwd=self.pwd())
                 if not sgn:
-                    wrp.dump()
-                cluster_dict[data_type][wrp.save_name()] = wrp.save_path() # relative path of the specified data.
-        with open(os.path.join(self.pwd(),'info.json'), 'w') as f:
-            json.dump(cluster_dict, f)
+                    writer.submit(self,data_type,data_name,data,_type2wrap_[data_type].snapshot(data))
 
-    def load(self):
-        if not os.path.exists(os.path.join(self.pwd(),'info.json')):
-            return True
+    def flush(self):
+        '''
+            block until all the registered data is on the disk.
+        '''
+        if self.auto_save == 'async':
+            AsyncWriter.default().flush()
+        if self.is_dirty():
+            self.dump()
+
+    def close(self):
+        '''
+            flush the cluster and deactivate this instance, use ESL.from_cluster to reopen it.
+        '''
+        self.flush()
+        if len(self._journaled) > 0 or os.path.exists(Journal.s_path(self.pwd())):
+            self.checkpoint()
+        self._prune_pending()
+        if self._shared_cluster is not None:
+            self._shared_cluster.detach()
+            self._shared_cluster = None
+        if ESL.__GLB_ESL_DICT__.get(self.cluster_id) is self:
+            ESL.__GLB_ESL_DICT__[self.cluster_id] = 'Silence'
+
+    def _attach_shared(self):
+        '''
+            replace the stored numpy arrays and tensors by views on their shared memory segments,
+            data registered later stays private to this process.
+        '''
+        tokens = {}
+        for data_type,_wrap_class_ in [('np',NumpyWrapper),('tc',TorchWrapper)]:
+            for data_name in self.data_dict[data_type]:
+                meta = self.cluster_info[data_type].get('{}-{}'.format(_wrap_class_.type_id(),data_name),{})
+                if self.data_dict[data_type][data_name][1] and 'chunked' not in meta:
+                    tokens[(data_type,data_name)] = meta.get('fp') or '{}:{}'.format(meta.get('path'),meta.get('size'))
+        self._shared_cluster = SharedCluster(self.pwd())
+        views = self._shared_cluster.attach(tokens,self._fetch)
+        for (data_type,data_name),view in views.items():
+            self.data_dict[data_type][data_name] = (view,True)
+            self._shared_keys.add((data_type,data_name)) # not private memory, never evicted.
+            self._touch(data_type,data_name)
+        if not self.lazy_load:
+            for data_type in ['np','tc']:
+                for data_name in self.data_dict[data_type]:
+                    self._fetch(data_type,data_name)
+
+    def save_stats(self):
+        return AsyncWriter.default().stats()
+
+    def _write_entries(self,entries,sync=False):
+        '''
+            dump entries of (data_type, data_name, origin, data) and then the cluster info,
+            an entry is marked clean only if the origin object is still the registered one.
+        :param sync: flush every written file, the cluster info and the cluster directory to the disk.
+        '''
+        _type2wrap_ = dict(zip(self.data_types(),self.wrap_classes()))
+        container_entries = [entry for entry in entries if entry[0] == 'dgl']
+        entries = [entry for entry in entries if entry[0] != 'dgl']
+        jobs = []
+        for data_type,data_name,_,data in entries:
+            _wrap_class_ = _type2wrap_[data_type]
+            wrp = _wrap_class_(data=data,data_name=data_name,cluster_pwd=self.pwd())
+            old_meta = self.cluster_info[data_type].get(wrp.save_name())
+            if old_meta is not None and not self._is_stored(wrp.save_name(),old_meta):
+                old_meta = None
+            jobs.append((data_type,_dump_wrapper,(wrp,old_meta,dict(self._dump_config(),codec=self._codec(data_type),sync=sync))))
+        has_error = False
+        written = []
+        with self._lock:
+            for (data_type,data_name,origin,_),ret in zip(entries,self._run_jobs(jobs)):
+                if isinstance(ret,Exception):
+                    lg.error('ESL {} failed to dump data {} of type {}: {}'.format(self.cluster_id,data_name,data_type,ret))
+                    has_error = True
+                    continue
+                save_name,meta,payload,duration = ret
+                self.entry_stats.setdefault((data_type,data_name),{})['dump'] = duration
+                if data_name not in self.data_dict[data_type]:
+                    continue # removed during writing.
+                if payload is not None:
+                    self.pack().put(save_name,payload)
+                old_meta = self.cluster_info[data_type].get(save_name)
+                if old_meta is not None and (old_meta.get('pack'),old_meta.get('path')) != (meta.get('pack'),meta.get('path')):
+                    self._remove_stored(save_name,old_meta) # moved among pack, inline and files.
+                self.cluster_info[data_type][save_name] = meta # relative path of the specified data & storage info.
+                if data_name in self.data_dict[data_type] and self.data_dict[data_type][data_name][0] is origin:
+                    self.data_dict[data_type][data_name] = (origin,True) # persisted, clean until re-registered.
+                written.append((data_type,data_name,origin))
+            if len(container_entries) > 0 and not self._write_container(container_entries,sync=sync):
+                has_error = True
+            if sync and self._pack_file is not None:
+                self._pack_file.sync()
+            self._commit_versions(written)
+            self._dump_info(sync=sync)
+        if logger.isEnabledFor(lg.DEBUG):
+            logger.debug('ESL %s dumped %d data',self.cluster_id,len(entries))
+        return not has_error
+
+    def _write_container(self,entries,sync=False):
+        '''
+            rewrite the dgl container with the graphs of entries and the other graphs already in it by one save_graphs,
+            skipped if all the graphs of entries are unchanged by fingerprint. return False on failure.
+        '''
+        st_time = time.perf_counter()
+        stored = self.cluster_info['dgl']
+        dirty = OrderedDict()
+        for _,data_name,_,data in entries:
+            save_name = '{}-{}'.format(DGLWrapper.type_id(),data_name)
+            if data_name in self.data_dict['dgl']:
+                dirty[save_name] = (data,util.fingerprint(data) if self.fingerprint else None)
+        is_changed = any(fp is None or 'idx' not in stored.get(save_name,{}) or stored[save_name].get('fp') != fp
+                         for save_name,(_,fp) in dirty.items())
         try:
-            with open(os.path.join(self.pwd(),'info.json'), 'r') as f:
-                load_dict = json.load(f)
-        except IOError:
-            lg.warning('ESL {} failed to open cluster info'.format(self.cluster_id))
+            if is_changed:
+                graphs,to_read = OrderedDict(),[]
+                for save_name,meta in stored.items():
+                    if 'idx' not in meta or save_name in dirty:
+                        continue
+                    data = self.data_dict['dgl'][DGLWrapper.decode_save_name(save_name=save_name)[1]][0]
+                    graphs[save_name] = data
+                    if isinstance(data,LazyData):
+                        to_read.append(save_name)
+                if len(to_read) > 0: # graphs not loaded yet are read back in one pass.
+                    for wrp in DGLWrapper.load_container(self.pwd(),to_read,[stored[save_name]['idx'] for save_name in to_read]):
+                        graphs[wrp.save_name()] = wrp.data
+                for save_name,(data,_) in dirty.items():
+                    graphs[save_name] = data
+                DGLWrapper.dump_container(self.pwd(),list(graphs.values()),sync=sync)
+                for idx,save_name in enumerate(graphs):
+                    old_meta = stored.get(save_name)
+                    fp = dirty[save_name][1] if save_name in dirty else old_meta.get('fp')
+                    if old_meta is not None and 'idx' not in old_meta:
+                        self._remove_stored(save_name,old_meta) # a graph file of the former versions.
+                    stored[save_name] = {'path':DGLWrapper.__CONTAINER__,'idx':idx}
+                    if fp is not None:
+                        stored[save_name]['fp'] = fp
+        except Exception as e:
+            lg.error('ESL {} failed to dump the dgl container: {}'.format(self.cluster_id,e))
             return False
+        duration = (time.perf_counter() - st_time) / max(len(entries),1)
+        for _,data_name,origin,_ in entries:
+            self.entry_stats.setdefault(('dgl',data_name),{})['dump'] = duration
+            if data_name in self.data_dict['dgl'] and self.data_dict['dgl'][data_name][0] is origin:
+                self.data_dict['dgl'][data_name] = (origin,True)
+        return True
+
+    def pack(self):
+        '''
+            the pack file of the cluster, see storage='packed'.
+        '''
+        with self._lock:
+            if self._pack_file is None:
+                self._pack_file = PackFile(self.pwd())
+            return self._pack_file
+
+    def compact(self):
+        '''
+            reclaim the space of overwritten and removed data in the pack file.
+        '''
+        with self._lock:
+            if self._pack_file is None and not os.path.exists(os.path.join(self.pwd(),PackFile.__INDEX__)):
+                return
+            self.pack().compact()
+
+    def _dump_config(self):
+        return {'storage':self.storage,'inline_threshold':self.inline_threshold,'fingerprint':self.fingerprint,
+                'blob_root':self.__class__.__ROOT_DIR__ if self.dedup else None,'codec_level':self.codec_level}
+
+    def _codec(self,data_type):
+        if isinstance(self.codec,dict):
+            return self.codec.get(data_type)
+        return self.codec
+
+    @classmethod
+    def gc_blobs(cls):
+        '''
+            delete the blobs of the dedup store no longer referenced by any cluster, return (number of blobs, bytes) removed.
+        '''
+        return BlobStore(cls.__ROOT_DIR__).gc()
+
+    def _is_stored(self,save_name,meta):
+        if 'inline' in meta:
+            return True
+        elif meta.get('pack'):
+            return save_name in self.pack().index
+        return os.path.exists(os.path.join(self.pwd(),meta['path']))
+
+    def _remove_stored(self,save_name,meta):
+        if meta.get('pack'):
+            self.pack().delete(save_name)
+        elif 'idx' in meta:
+            # a removed graph stays in the dgl container until it is rewritten, or deleted with the last graph.
+            if not any('idx' in other for other in self.cluster_info['dgl'].values()) and os.path.exists(DGLWrapper.container_path(self.pwd())):
+                os.remove(DGLWrapper.container_path(self.pwd()))
+        elif 'path' in meta and os.path.isdir(os.path.join(self.pwd(),meta['path'])):
+            shutil.rmtree(os.path.join(self.pwd(),meta['path'])) # chunked data.
+        elif 'path' in meta and os.path.exists(os.path.join(self.pwd(),meta['path'])):
+            os.remove(os.path.join(self.pwd(),meta['path']))
+
+    def _load_job(self,data_type,_wrap_class_,save_name):
+        '''
+            (func, args) that loads a data from its file or the pack file.
+        '''
+        _,data_name = _wrap_class_.decode_save_name(save_name=save_name)
+        options = self._load_options(data_type,data_name)
+        meta = self.cluster_info[data_type].get(save_name,{})
+        if 'codec' in meta:
+            options.pop('mmap_mode',None) # decompressed into the memory.
+        if 'inline' in meta:
+            return _inline_load_wrapper,(_wrap_class_,save_name,self.pwd(),meta['inline'],options)
+        if 'idx' in meta:
+            return _load_wrapper,(_wrap_class_,save_name,self.pwd(),dict(options,idx=meta['idx']),meta,self.verify)
+        if not meta.get('pack'):
+            if data_type == 'inn' and 'codec' not in meta:
+                options['stream'] = bool(meta.get('stream')) # the file the cluster info points to, never a stray one.
+            return _load_wrapper,(_wrap_class_,save_name,self.pwd(),options,meta,self.verify)
+        if self._executor_kind(data_type) == 'process' and self.workers > 1:
+            source = self.pack().read(save_name)
+        elif options.get('mmap_mode') is not None:
+            source = self.pack().view(save_name)
+        else:
+            source = self.pack()
+        return _unpack_wrapper,(_wrap_class_,save_name,self.pwd(),source,options,meta,self.verify)
+
+    def _dump_info(self,sync=False):
+        info_path = os.path.join(self.pwd(),'info.json')
+        with open(info_path + '.tmp', 'w') as f:
+            json.dump(self.cluster_info, f, sort_keys=True)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(info_path + '.tmp',info_path) # a crash never leaves a torn cluster info.
+        if sync:
+            util.fsync_dir(self.pwd()) # the renames of the files and the cluster info.
+        self.catalog().update(self.cluster_id,self.cluster_info)
+
+    def load(self,version=None,as_of=None):
+        '''
+            load the cluster from the disk, return False if some data is destroyed.
+            with a version id (or as_of, a timestamp) of a versioned cluster, return instead a DataView of the data at
+            that version, only the chunks of those data versions are read and the current data is untouched.
+        '''
+        if version is not None or as_of is not None:
+            return self._load_version(version,as_of)
+        journaled = Journal(self.pwd()).replay() if os.path.exists(Journal.s_path(self.pwd())) else {}
+        if not os.path.exists(os.path.join(self.pwd(),'info.json')):
+            load_dict = {data_type:{} for data_type in self.data_types()}
+            if len(journaled) == 0:
+                return True
+        else:
+            try:
+                with open(os.path.join(self.pwd(),'info.json'), 'r') as f:
+                    load_dict = json.load(f)
+            except IOError:
+                lg.warning('ESL {} failed to open cluster info'.format(self.cluster_id))
+                return False
         assert load_dict is not None
         self.init_data_dict()
+        for data_type in self.data_types():
+            for save_name,meta in load_dict.get(data_type,{}).items():
+                self.cluster_info[data_type][save_name] = meta if isinstance(meta,dict) else {'path':meta} # former versions store the path.
+        jobs,job_keys = [],[]
+        container_names = [] # eager graphs of the dgl container, loaded by one job.
         has_error = False
         for data_type,_wrap_class_ in zip(self.__class__.data_types(),self.__class__.wrap_classes()):
             for save_name in load_dict[data_type]:
-                wrp = _wrap_class_.load(save_name=save_name,cluster_pwd=self.pwd())
+                _,data_name = _wrap_class_.decode_save_name(save_name=save_name)
+                meta = self.cluster_info[data_type][save_name]
+                if '{}/{}'.format(data_type,data_name) in journaled:
+                    if journaled['{}/{}'.format(data_type,data_name)] is None:
+                        self.cluster_info[data_type].pop(save_name) # removed, the crash came before the cluster info was written.
+                    continue # the journal holds a later version, the file may be torn by a crash during checkpoint.
+                if (self.lazy_load or (self.shared and data_type in ['np','tc'])) and 'inline' not in meta:
+                    if not meta.get('pack') and not _check_size(self.pwd(),meta):
+                        lg.warning('ESL {} detects the destroyed data with save name {}, size mismatch.'.format(self.cluster_id,save_name))
+                        self.cluster_info[data_type].pop(save_name)
+                        has_error = True
+                        continue
+                    self.data_dict[data_type][data_name] = (LazyData(owner=self,data_type=data_type,data_name=data_name),True)
+                    continue
+                if 'idx' in meta:
+                    container_names.append(save_name)
+                    continue
+                func,args = self._load_job(data_type,_wrap_class_,save_name)
+                jobs.append((data_type,func,args))
+                job_keys.append([(data_type,save_name)])
+        if len(container_names) > 0:
+            idx_list = [self.cluster_info['dgl'][save_name]['idx'] for save_name in container_names]
+            jobs.append(('dgl',_load_container_wrapper,(DGLWrapper,container_names,self.pwd(),idx_list,self.cluster_info['dgl'],self.verify)))
+            job_keys.append([('dgl',save_name) for save_name in container_names])
+        config_error = None
+        for keys,ret in zip(job_keys,self._run_jobs(jobs)):
+            if isinstance(ret,Exception) and not _is_destroyed(ret):
+                # e.g. a missing optional package or a bad load option, the stored data is kept.
+                lg.error('ESL {} failed to load data {}: {}'.format(self.cluster_id,[save_name for _,save_name in keys],ret))
+                for data_type,save_name in keys:
+                    _,data_name = dict(zip(self.data_types(),self.wrap_classes()))[data_type].decode_save_name(save_name=save_name)
+                    self.data_dict[data_type][data_name] = (LazyData(owner=self,data_type=data_type,data_name=data_name),True)
+                config_error = ret if config_error is None else config_error
+                continue
+            if isinstance(ret,Exception):
+                wrps = [None] * len(keys)
+            else:
+                wrps = ret[0] if isinstance(ret[0],list) else [ret[0]]
+            for (data_type,save_name),wrp in zip(keys,wrps):
                 if wrp is not None:
-                    self.data_dict[data_type][wrp.data_name] = (wrp.data,False)
+                    self.data_dict[data_type][wrp.data_name] = (wrp.data,True)
+                    self._touch(data_type,wrp.data_name,is_new=True)
+                    self.entry_stats.setdefault((data_type,wrp.data_name),{})['load'] = ret[1] / len(keys)
                 else:
-                    lg.warning('ESL {} detects the destroyed data with save name {}'.format(self.cluster_id,save_name))
+                    lg.warning('ESL {} detects the destroyed data with save name {}{}'.format(
+                        self.cluster_id,save_name,': {}'.format(ret) if isinstance(ret,Exception) else ''))
+                    self.cluster_info[data_type].pop(save_name) # dropped from the cluster info if force_delete.
                     has_error = True
+        _type2wrap_ = dict(zip(self.data_types(),self.wrap_classes()))
+        for key,payload in journaled.items():
+            data_type,data_name = key.split('/',1)
+            if payload is None:
+                continue # removed after the journal was written.
+            try:
+                wrp = _type2wrap_[data_type].from_bytes(data_name=data_name,cluster_pwd=self.pwd(),payload=payload)
+            except Exception as e:
+                lg.warning('ESL {} failed to replay data {} of type {} from the journal: {}'.format(self.cluster_id,data_name,data_type,e))
+                has_error = True
+                continue
+            self.data_dict[data_type][data_name] = (wrp.data,True)
+            self._journaled.add((data_type,data_name))
+            self._touch(data_type,data_name,is_new=True)
+        if config_error is not None:
+            raise config_error
+        if len(journaled) > 0 and self._journal is None and not has_error:
+            self.checkpoint() # replayed by a cluster without journal, fold it into the files right away.
+        self._enforce_budget()
+        if logger.isEnabledFor(lg.DEBUG):
+            logger.debug('ESL %s loaded %d data, lazy: %s',self.cluster_id,len(jobs),self.lazy_load)
         return not has_error
 
+    def _executor_kind(self,data_type):
+        if isinstance(self.executor,dict):
+            return self.executor.get(data_type,'thread')
+        return self.executor
+
+    def _run_jobs(self,jobs):
+        '''
+            run jobs of (data_type, func, args) by at most self.workers threads or processes,
+            return the results in order, where the exception of a failed job is returned instead of raised.
+        '''
+        rets = [None] * len(jobs)
+        if self.workers <= 1 or len(jobs) <= 1:
+            for idx,(_,func,args) in enumerate(jobs):
+                try:
+                    rets[idx] = func(*args)
+                except Exception as e:
+                    rets[idx] = e
+            return rets
+        kind2idx = {}
+        for idx,(data_type,_,_) in enumerate(jobs):
+            kind2idx.setdefault(self._executor_kind(data_type),[]).append(idx)
+        for kind in kind2idx:
+            _pool_cls_ = ProcessPoolExecutor if kind == 'process' else ThreadPoolExecutor
+            with _pool_cls_(max_workers=min(self.workers,len(kind2idx[kind]))) as pool:
+                futures = {pool.submit(jobs[idx][1],*jobs[idx][2]):idx for idx in kind2idx[kind]}
+                for future in as_completed(futures):
+                    try:
+                        rets[futures[future]] = future.result()
+                    except Exception as e:
+                        rets[futures[future]] = e
+        return rets
+
+    def _load_options(self,data_type,data_name):
+        options = {}
+        if data_type in ['np','tc'] and self.mmap_mode is not None:
+            options['mmap_mode'] = self.mmap_mode
+        options.update(self.load_options.get((data_type,data_name),{}))
+        return options
+
+    def set_load_options(self,data_name,data_type='np',**options):
+        '''
+            set the loading options of a single data, e.g. set_load_options('feat',mmap_mode='r') for a memory-mapped array.
+            the data already loaded and unmodified will be reloaded with the new options on its next access.
+        '''
+        if 'mmap_mode' in options:
+            NumpyWrapper.check_mmap_mode(options['mmap_mode'])
+        self.load_options[(data_type,data_name)] = options
+        if data_name in self.data_dict[data_type]:
+            data,sgn = self.data_dict[data_type][data_name]
+            if sgn and not isinstance(data,LazyData):
+                self.data_dict[data_type][data_name] = (LazyData(owner=self,data_type=data_type,data_name=data_name),True)
+                self._touch(data_type,data_name)
+
+    def _fetch(self,data_type,data_name):
+        '''
+            get the data by type and name, materialize it from the disk if it is still lazy.
+        '''
+        data,sgn = self.data_dict[data_type][data_name]
+        if not isinstance(data,LazyData):
+            if self._is_budgeted():
+                self.cache_stats['hits'] += 1
+                self._touch(data_type,data_name)
+            return data
+        self.cache_stats['misses'] += 1
+        _wrap_class_ = dict(zip(self.data_types(),self.wrap_classes()))[data_type]
+        save_name = '{}-{}'.format(_wrap_class_.type_id(),data_name)
+        func,args = self._load_job(data_type,_wrap_class_,save_name)
+        wrp,duration = func(*args)
+        if wrp is None:
+            lg.error('ESL {} detects the destroyed data with save name {}'.format(self.cluster_id,save_name))
+            raise IOError
+        self.data_dict[data_type][data_name] = (wrp.data,sgn)
+        self.entry_stats.setdefault((data_type,data_name),{})['load'] = duration
+        self._touch(data_type,data_name,is_new=True)
+        self._enforce_budget(keep=(data_type,data_name))
+        return wrp.data
+
+    def _is_budgeted(self):
+        return self.memory_budget is not None or ESL.__GLB_MEMORY_BUDGET__ is not None
+
+    def _touch(self,data_type,data_name,is_new=False):
+        '''
+            mark the data as the most recently used one, its size is measured again if is_new.
+            the data no longer held in memory is dropped from the accounting.
+        '''
+        if not self._is_budgeted():
+            return
+        key = (data_type,data_name)
+        with self._lock:
+            item = self._resident.pop(key,None)
+            if item is not None:
+                self._resident_bytes -= item[0]
+            entry = self.data_dict[data_type].get(data_name)
+            if entry is None or isinstance(entry[0],LazyData) or key in self._shared_keys:
+                return
+            n_bytes = util.sizeof(entry[0]) if is_new or item is None else item[0]
+            self._resident[key] = [n_bytes,next(ESL.__TICKS__)]
+            self._resident_bytes += n_bytes
+
+    def _evict(self,data_type,data_name):
+        '''
+            drop the data from memory, it is written first if dirty. return False if it can not be written.
+        '''
+        with self._lock:
+            key = (data_type,data_name)
+            entry = self.data_dict[data_type].get(data_name)
+            if entry is None or isinstance(entry[0],LazyData):
+                self._touch(data_type,data_name)
+                return True
+            if key in self._journaled:
+                return False # only in the journal until the next checkpoint.
+            data,sgn = entry
+            if not sgn:
+                if not self._write_entries([(data_type,data_name,data,data)]) or not self.data_dict[data_type][data_name][1]:
+                    return False
+                self.cache_stats['flushes'] += 1
+            self.data_dict[data_type][data_name] = (LazyData(owner=self,data_type=data_type,data_name=data_name),True)
+            n_bytes,_ = self._resident.pop(key)
+            self._resident_bytes -= n_bytes
+            self.cache_stats['evictions'] += 1
+            self.cache_stats['evicted_bytes'] += n_bytes
+            return True
+
+    def _enforce_budget(self,keep=None):
+        '''
+            evict the least recently used data until the cluster and all the clusters are within their budgets.
+        :param keep: (data type, data name) of the data being accessed, never evicted.
+        '''
+        if self.memory_budget is not None:
+            for key in list(self._resident):
+                if self._resident_bytes <= self.memory_budget:
+                    break
+                if key != keep:
+                    self._evict(*key)
+        if ESL.__GLB_MEMORY_BUDGET__ is not None:
+            ESL._enforce_global_budget(keep=(self,keep))
+
+    @classmethod
+    def _enforce_global_budget(cls,keep=None):
+        clusters = [esl for esl in list(ESL.__GLB_ESL_DICT__.values()) if esl != 'Silence']
+        n_total = sum(esl._resident_bytes for esl in clusters)
+        items = sorted(((tick,esl,key) for esl in clusters for key,(_,tick) in list(esl._resident.items())),key=lambda item:item[0])
+        for _,esl,key in items:
+            if n_total <= ESL.__GLB_MEMORY_BUDGET__:
+                break
+            if keep is not None and esl is keep[0] and key == keep[1]:
+                continue
+            n_bytes = esl._resident.get(key,[0])[0]
+            if esl._evict(*key):
+                n_total -= n_bytes
+
+    @classmethod
+    def set_memory_budget(cls,max_bytes):
+        '''
+            budget of the approximate bytes of the data held in memory by all the live clusters together,
+            on top of the budget of each cluster. None for no global budget.
+        '''
+        ESL.__GLB_MEMORY_BUDGET__ = max_bytes
+        if max_bytes is None:
+            return
+        for esl in list(ESL.__GLB_ESL_DICT__.values()):
+            if esl != 'Silence':
+                for data_type in esl.data_types():
+                    for data_name in esl.data_dict[data_type]:
+                        if (data_type,data_name) not in esl._resident:
+                            esl._touch(data_type,data_name)
+        ESL._enforce_global_budget()
+
+    def stats(self):
+        '''
+            cheap summary of the cluster: name, type, dirty flag, approximate memory bytes (None if not loaded),
+            bytes on disk and the last dump / load seconds of each data, and the counters of the memory budget.
+        '''
+        entries = []
+        for data_type,_wrap_class_ in zip(self.data_types(),self.wrap_classes()):
+            for data_name in self.data_dict[data_type]:
+                data,sgn = self.data_dict[data_type][data_name]
+                save_name = '{}-{}'.format(_wrap_class_.type_id(),data_name)
+                meta = self.cluster_info[data_type].get(save_name,{})
+                disk_path = None if 'path' not in meta or meta.get('pack') or 'idx' in meta else os.path.join(self.pwd(),meta['path'])
+                disk_bytes = os.path.getsize(disk_path) if disk_path is not None and os.path.isfile(disk_path) else None
+                if meta.get('pack') and save_name in self.pack().index:
+                    disk_bytes = self.pack().index[save_name][1]
+                entry_stats = self.entry_stats.get((data_type,data_name),{})
+                entries.append({'name':data_name,'type':data_type,'dirty':not sgn,
+                                'bytes':None if isinstance(data,LazyData) else util.sizeof(data),
+                                'disk_bytes':disk_bytes,
+                                'dump_seconds':entry_stats.get('dump'),'load_seconds':entry_stats.get('load')})
+        return {'cluster':self.cluster_id,'entries':entries,
+                'bytes':sum(entry['bytes'] for entry in entries if entry['bytes'] is not None),
+                'disk_bytes':sum(entry['disk_bytes'] for entry in entries if entry['disk_bytes'] is not None),
+                'cache':dict(self.cache_stats,resident_bytes=self._resident_bytes,budget=self.memory_budget)}
+
+    def _view_value(self,data_type,data_name):
+        data = self.data_dict[data_type][data_name][0]
+        if self._is_budgeted() and not isinstance(data,LazyData):
+            return LazyData(owner=self,data_type=data_type,data_name=data_name) # accessed through _fetch to be counted as used.
+        return data
+
     def data_view(self):
         dv = DataView()
         for data_type in self.data_types():
             obj_type = dv.__getattribute__(data_type)
             type_data_dict = self.data_dict[data_type]
             for data_name in type_data_dict:
-                setattr(obj_type,data_name,type_data_dict[data_name][0])
+                setattr(obj_type,data_name,self._view_value(data_type,data_name))
         return dv
 
     def direct_data_view(self):
@@ -262,10 +1168,10 @@ class ESL:
         for data_name in self.data2type:
             data_type = self.data2type[data_name]
             if len(data_type) == 1:
-                setattr(dv, data_name, self.data_dict[data_type[0]][data_name][0])
+                setattr(dv, data_name, self._view_value(data_type[0],data_name))
             else:
                 for i in range(len(data_type)):
-                    setattr(dv, '{}_{}'.format(data_name,data_type), self.data_dict[data_type[i]][data_name][0])
+                    setattr(dv, '{}_{}'.format(data_name,data_type), self._view_value(data_type[i],data_name))
         return dv
 
     def dv(self):
@@ -281,46 +1187,45 @@ class ESL:
         return self.direct_data_view()
 
     def inn(self):
-        print(f'{self} inn:{self.data_dict}')
         obj = DataView.SubDataView()
         type_data_dict = self.data_dict['inn']
         for data_name in type_data_dict:
-            setattr(obj, data_name, type_data_dict[data_name][0])
+            setattr(obj, data_name, self._view_value('inn',data_name))
         return obj
 
     def np(self):
         obj = DataView.SubDataView()
         type_data_dict = self.data_dict['np']
         for data_name in type_data_dict:
-            setattr(obj, data_name, type_data_dict[data_name][0])
+            setattr(obj, data_name, self._view_value('np',data_name))
         return obj
 
     def pd(self):
         obj = DataView.SubDataView()
         type_data_dict = self.data_dict['pd']
         for data_name in type_data_dict:
-            setattr(obj, data_name, type_data_dict[data_name][0])
+            setattr(obj, data_name, self._view_value('pd',data_name))
         return obj
 
     def tc(self):
         obj = DataView.SubDataView()
         type_data_dict = self.data_dict['tc']
         for data_name in type_data_dict:
-            setattr(obj, data_name, type_data_dict[data_name][0])
+            setattr(obj, data_name, self._view_value('tc',data_name))
         return obj
 
     def dgl(self):
         obj = DataView.SubDataView()
         type_data_dict = self.data_dict['dgl']
         for data_name in type_data_dict:
-            setattr(obj, data_name, type_data_dict[data_name][0])
+            setattr(obj, data_name, self._view_value('dgl',data_name))
         return obj
 
     def nx(self):
         obj = DataView.SubDataView()
         type_data_dict = self.data_dict['nx']
         for data_name in type_data_dict:
-            setattr(obj, data_name, type_data_dict[data_name][0])
+            setattr(obj, data_name, self._view_value('nx',data_name))
         return obj
 
 class DataView:
@@ -336,49 +1241,414 @@ class DataView:
         self.nx = DataView.SubDataView()
 
     class SubDataView:
-        pass
+        def __getattribute__(self, item):
+            value = object.__getattribute__(self,item)
+            if isinstance(value,LazyData):
+                value = value.materialize()
+                object.__setattr__(self,item,value)
+            return value
+
+class AsyncWriter:
+    '''
+        background writer of the clusters in async auto-save mode,
+        repeated registrations of the same data waiting to be written are coalesced so only the latest one is written.
+    '''
+    __DEFAULT__ = None
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.pending = OrderedDict() # (cluster id, data type, data name) -> (esl, origin, snapshot, submit time)
+        self.n_writing = 0
+        self.is_closed = False
+        self.n_saved = 0
+        self.n_coalesced = 0
+        self.n_failed = 0
+        self.latency_sum = 0.
+        self.latency_max = 0.
+        self.latency_last = 0.
+        self.thread = threading.Thread(target=self._run,name='esl-async-writer',daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def default(cls):
+        if cls.__DEFAULT__ is None or cls.__DEFAULT__.is_closed:
+            cls.__DEFAULT__ = AsyncWriter()
+        return cls.__DEFAULT__
+
+    @classmethod
+    def close_default(cls):
+        if cls.__DEFAULT__ is not None:
+            cls.__DEFAULT__.close()
+
+    def submit(self,esl,data_type,data_name,origin,snapshot):
+        key = (esl.cluster_id,data_type,data_name)
+        with self.cond:
+            if key in self.pending:
+                if self.pending[key][1] is origin:
+                    return
+                self.n_coalesced += 1
+                del self.pending[key]
+            self.pending[key] = (esl,origin,snapshot,time.time())
+            self.cond.notify_all()
+
+    def flush(self):
+        '''
+            block until all the submitted data is written.
+        '''
+        with self.cond:
+            while len(self.pending) > 0 or self.n_writing > 0:
+                self.cond.wait()
+
+    def close(self):
+        self.flush()
+        with self.cond:
+            self.is_closed = True
+            self.cond.notify_all()
+        self.thread.join()
+
+    def stats(self):
+        with self.cond:
+            return {'queue_depth':len(self.pending),'writing':self.n_writing,'saved':self.n_saved,
+                    'coalesced':self.n_coalesced,'failed':self.n_failed,'latency_last':self.latency_last,
+                    'latency_mean':self.latency_sum / self.n_saved if self.n_saved > 0 else 0.,'latency_max':self.latency_max}
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while len(self.pending) == 0 and not self.is_closed:
+                    self.cond.wait()
+                if len(self.pending) == 0:
+                    return
+                batch,self.pending = self.pending,OrderedDict()
+                self.n_writing = len(batch)
+            esl2entries = OrderedDict()
+            for (_,data_type,data_name),(esl,origin,snapshot,st_time) in batch.items():
+                esl2entries.setdefault(esl,[]).append((data_type,data_name,origin,snapshot,st_time))
+            for esl,entries in esl2entries.items():
+                try:
+                    is_ok = esl._write_entries([entry[:4] for entry in entries])
+                except Exception as e:
+                    lg.error('ESL async writer failed to save cluster {}: {}'.format(esl.cluster_id,e))
+                    is_ok = False
+                ed_time = time.time()
+                with self.cond:
+                    if not is_ok:
+                        self.n_failed += len(entries)
+                        continue
+                    for entry in entries:
+                        self.latency_last = ed_time - entry[4]
+                        self.latency_sum += self.latency_last
+                        self.latency_max = max(self.latency_max,self.latency_last)
+                    self.n_saved += len(entries)
+            with self.cond:
+                self.n_writing = 0
+                self.cond.notify_all()
+
+atexit.register(AsyncWriter.close_default)
+
+def _dump_wrapper(wrp,old_meta,config):
+    '''
+        store a data inline, into the pack payload or its own file, skipped if its content fingerprint equals the stored one.
+        module level for pickling into process executors.
+    '''
+    st_time = time.perf_counter()
+    wrp.sync = config.get('sync',False)
+    if wrp.is_chunked():
+        wrp.dump() # chunks are written in place, only the manifest is left.
+        return wrp.save_name(),{'path':wrp.save_path(),'chunked':True},None,time.perf_counter() - st_time
+    fp = util.fingerprint(wrp.data) if config['fingerprint'] else None
+    if fp is not None and old_meta is not None and old_meta.get('fp') == fp:
+        if wrp.sync and 'path' in old_meta and not old_meta.get('pack') and os.path.exists(os.path.join(wrp.cluster_pwd,old_meta['path'])):
+            util.fsync_path(os.path.join(wrp.cluster_pwd,old_meta['path'])) # may be written unflushed before.
+        return wrp.save_name(),old_meta,None,time.perf_counter() - st_time
+    inline_threshold = config['inline_threshold']
+    inline_value = wrp.to_inline(inline_threshold) if inline_threshold and wrp.is_support_inline() else None
+    payload,codec = None,None
+    if inline_value is None and config['codec'] is not None and wrp.is_support_joint():
+        payload = wrp.to_bytes()
+        codec,level = Codec.choose(payload,config['codec_level']) if config['codec'] == 'auto' else (config['codec'],config['codec_level'])
+        payload = payload if codec is None else Codec.compress(codec,payload,level)
+    if inline_value is not None:
+        meta = {'inline':inline_value}
+    elif config['storage'] == 'packed' and wrp.is_support_joint():
+        # serialized in parallel, appended to the pack file by the cluster.
+        payload = wrp.to_bytes() if payload is None else payload
+        meta = {'path':PackFile.__INDEX__,'pack':True}
+    else:
+        save_path = wrp.save_path() if codec is None else '{}.{}'.format(wrp.save_name(),codec)
+        path = os.path.join(wrp.cluster_pwd,save_path)
+        if os.path.isfile(path) and os.stat(path).st_nlink > 1:
+            os.remove(path) # never write through a hard link shared with the blob store.
+        blob_store = BlobStore(config['blob_root']) if config['blob_root'] is not None and fp is not None else None
+        blob_key = None if blob_store is None else fp + save_path[len(wrp.save_name()):]
+        if blob_store is not None and blob_store.exists(blob_key):
+            blob_store.link(blob_key,path) # identical data written once.
+            if wrp.sync:
+                util.fsync_path(path)
+        else:
+            if codec is None:
+                if payload is None or not wrp.dump_bytes(payload): # the payload of 'auto' left raw is not serialized again.
+                    wrp.dump()
+                save_path = wrp.save_path()
+                path = wrp.pwd()
+            else:
+                with open(path + '.tmp','wb') as f:
+                    f.write(payload)
+                wrp._replace(path + '.tmp',path)
+            if blob_store is not None and os.path.isfile(path): # data stored as directories is not deduplicated.
+                blob_key = fp + save_path[len(wrp.save_name()):]
+                blob_store.put(blob_key,path)
+            else:
+                blob_key = None
+        payload = None
+        meta = {'path':save_path,'size':os.path.getsize(path) if os.path.isfile(path) else None}
+        if blob_key is not None:
+            meta['blob'] = blob_key
+    if codec is not None:
+        meta['codec'] = codec
+    if fp is not None:
+        meta['fp'] = fp
+    return wrp.save_name(),meta,payload,time.perf_counter() - st_time
+
+def _check_loaded(wrp,meta,verify):
+    if wrp is not None and verify and 'fp' in meta and util.fingerprint(wrp.data) != meta['fp']:
+        lg.warning('ESL detects the fingerprint mismatch of data {}'.format(wrp.save_name()))
+        return None
+    return wrp
+
+def _inline_load_wrapper(_wrap_class_,save_name,cluster_pwd,inline_value,options):
+    st_time = time.perf_counter()
+    _,data_name = _wrap_class_.decode_save_name(save_name=save_name)
+    wrp = _wrap_class_.from_inline(data_name=data_name,cluster_pwd=cluster_pwd,value=inline_value,**options)
+    return wrp,time.perf_counter() - st_time
+
+def _load_wrapper(_wrap_class_,save_name,cluster_pwd,options,meta,verify):
+    st_time = time.perf_counter()
+    if not _check_size(cluster_pwd,meta):
+        lg.warning('ESL detects the size mismatch of data {}, the file may be truncated.'.format(save_name))
+        return None,time.perf_counter() - st_time
+    if 'codec' in meta:
+        with open(os.path.join(cluster_pwd,meta['path']),'rb') as f:
+            payload = Codec.decompress(meta['codec'],f.read())
+        _,data_name = _wrap_class_.decode_save_name(save_name=save_name)
+        wrp = _wrap_class_.from_bytes(data_name=data_name,cluster_pwd=cluster_pwd,payload=payload,**options)
+    else:
+        wrp = _wrap_class_.load(save_name=save_name,cluster_pwd=cluster_pwd,**options)
+    return _check_loaded(wrp,meta,verify),time.perf_counter() - st_time
+
+def _load_container_wrapper(_wrap_class_,save_names,cluster_pwd,idx_list,metas,verify):
+    st_time = time.perf_counter()
+    wrps = _wrap_class_.load_container(cluster_pwd,save_names,idx_list)
+    return [_check_loaded(wrp,metas[save_name],verify) for save_name,wrp in zip(save_names,wrps)],time.perf_counter() - st_time
+
+def _is_destroyed(e):
+    # integrity failures of a stored data (missing or torn files, decode errors), the other errors are raised as they are.
+    return isinstance(e,(IOError,EOFError,pickle.UnpicklingError,zlib.error,lzma.LZMAError,struct.error,UnicodeDecodeError))
+
+def _check_size(cluster_pwd,meta):
+    # cheap integrity check of a stored file without deserializing it.
+    if meta.get('size') is None:
+        return True
+    path = os.path.join(cluster_pwd,meta['path'])
+    return os.path.isfile(path) and os.path.getsize(path) == meta['size']
+
+def _unpack_wrapper(_wrap_class_,save_name,cluster_pwd,source,options,meta,verify):
+    # source is the pack file, or the payload already read from it.
+    st_time = time.perf_counter()
+    payload = source.read(save_name) if isinstance(source,PackFile) else source
+    if payload is None:
+        return None,time.perf_counter() - st_time
+    if 'codec' in meta:
+        payload = Codec.decompress(meta['codec'],payload)
+    _,data_name = _wrap_class_.decode_save_name(save_name=save_name)
+    wrp = _wrap_class_.from_bytes(data_name=data_name,cluster_pwd=cluster_pwd,payload=payload,**options)
+    return _check_loaded(wrp,meta,verify),time.perf_counter() - st_time
 
 '''
 Decoration.
 '''
-def auto_save(func):
+class FuncCache:
+    '''
+        persistent memoization of a decorated function in its FUNC cluster.
+        results are keyed by the stable hash of the call kwargs and stored with the kwargs of each key, and the cache
+        entries are evicted in LRU order beyond max_entries / max_bytes, or when older than max_age seconds.
+        the kwargs and results of the latest call are also kept by their plain names (in_a, __ret_0__, ...).
+        access times of cache hits are saved in batches of __FLUSH_EVERY__ hits, by the next put, or at exit.
+    '''
+    __INDEX__ = '__cache__'
+    __FLUSH_EVERY__ = 64
+
+    def __init__(self,func_name,max_entries=None,max_bytes=None,max_age=None,async_save=False):
+        self.func_name = func_name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.async_save = async_save
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._atimes = {} # key -> access time of the hits not saved yet.
+        atexit.register(self.flush)
+
+    def esl(self):
+        return ESL.from_cluster(cluster_name=self.func_name,cluster_type='FUNC',lazy_load=True,auto_save=False,force_delete=True)
+
+    def index(self):
+        func_esl = self.esl()
+        if self.__INDEX__ not in func_esl.data_dict['inn']:
+            return {}
+        return func_esl._fetch('inn',self.__INDEX__)
+
+    def key(self,kwargs):
+        '''
+            stable hash of the call kwargs, None if they can not be hashed by content.
+        '''
+        try:
+            return util.stable_hash(kwargs)
+        except TypeError as e:
+            lg.warning('ESL can not cache the call of function {}: {}'.format(self.func_name,e))
+            return None
+
+    @classmethod
+    def ret_name(cls,key,idx):
+        return '__ret_{}__{}'.format(idx,key)
+
+    @classmethod
+    def args_name(cls,key):
+        return '__args__{}'.format(key)
+
+    def _entry_names(self,key,index):
+        return [self.ret_name(key,idx) for idx in range(len(index[key]['types']))] + [self.args_name(key)]
+
+    def get(self,key):
+        '''
+            return (True, rets) on a cache hit, (False, None) otherwise.
+        '''
+        func_esl = self.esl()
+        index = dict(self.index())
+        if key not in index or (self.max_age is not None and time.time() - index[key]['ctime'] > self.max_age):
+            self.misses += 1
+            return False,None
+        try:
+            rets = tuple(func_esl._fetch(data_type,self.ret_name(key,idx)) for idx,data_type in enumerate(index[key]['types']))
+        except (KeyError,IOError):
+            lg.warning('ESL cache of function {} destroyed for key {}, recompute it.'.format(self.func_name,key))
+            self.misses += 1
+            return False,None
+        self._atimes[key] = time.time()
+        self.hits += 1
+        if len(self._atimes) >= self.__FLUSH_EVERY__:
+            self.flush()
+        return True,rets
+
+    def _merge_atimes(self,index):
+        for key,atime in self._atimes.items():
+            if key in index:
+                index[key] = dict(index[key],atime=atime)
+        self._atimes.clear()
+
+    def flush(self):
+        '''
+            save the access times of the cache hits.
+        '''
+        if len(self._atimes) == 0:
+            return
+        index = dict(self.index())
+        self._merge_atimes(index)
+        self._save(self.esl(),index)
+
+    def put(self,key,rets,kwargs):
+        func_esl = self.esl()
+        ret_dict = {self.ret_name(key,idx):ret for idx,ret in enumerate(rets)}
+        ret_dict[self.args_name(key)] = dict(kwargs)
+        ret_dict.update(kwargs) # the latest call by plain names, as ESL.from_func(func).data_view() reads it.
+        ret_dict.update({'__ret_{}__'.format(idx):ret for idx,ret in enumerate(rets)})
+        ret_dict['__ret_len__'] = len(rets)
+        func_esl.register(**ret_dict)
+        index = dict(self.index())
+        self._merge_atimes(index)
+        cur_time = time.time()
+        index[key] = {'types':[func_esl._check_data_type(ret) for ret in rets],'ctime':cur_time,'atime':cur_time,
+                      'size':sum(util.sizeof(ret) for ret in rets) + util.sizeof(kwargs)}
+        self._evict(func_esl,index)
+        self._save(func_esl,index)
+
+    def _save(self,func_esl,index):
+        func_esl.register(**{self.__INDEX__:index})
+        if self.async_save:
+            func_esl.dump_async()
+        else:
+            func_esl.dump()
+
+    def _evict(self,func_esl,index):
+        cur_time = time.time()
+        keys = sorted(index,key=lambda key:index[key]['atime']) # LRU first.
+        total_bytes = sum(index[key]['size'] for key in keys)
+        for key in keys:
+            is_expired = self.max_age is not None and cur_time - index[key]['ctime'] > self.max_age
+            is_over = (self.max_entries is not None and len(index) > self.max_entries) or \
+                      (self.max_bytes is not None and total_bytes > self.max_bytes)
+            if not is_expired and not is_over:
+                continue
+            func_esl.remove(*self._entry_names(key,index))
+            total_bytes -= index[key]['size']
+            del index[key]
+            self.evictions += 1
+
+    def clear(self):
+        func_esl = self.esl()
+        index = dict(self.index())
+        for key in index:
+            func_esl.remove(*self._entry_names(key,index))
+        self._atimes.clear()
+        self.evictions += len(index)
+        self._save(func_esl,{})
+
+    def stats(self):
+        index = self.index()
+        return {'hits':self.hits,'misses':self.misses,'evictions':self.evictions,
+                'entries':len(index),'bytes':sum(index[key]['size'] for key in index)}
+
+
+def _cache_decorator(func,read_cache,**cache_kwargs):
+    cache = FuncCache(func_name=func.__name__,**cache_kwargs)
     def _decorated_func(**kwargs):
-        func_esl = ESL.from_cluster(cluster_name=func.__name__,cluster_type='FUNC',load_data=False,auto_save=False,force_delete=True)
-        func_esl.register(**kwargs)
+        key = cache.key(kwargs)
+        if key is None:
+            return func(**kwargs)
+        if read_cache:
+            is_hit,rets = cache.get(key)
+            if is_hit:
+                return rets if len(rets) > 1 else rets[0]
         rets = func(**kwargs)
         if type(rets) is not tuple:
             rets = (rets,)
-        ret_dict = {}
-        ret_dict['__ret_len__'] = len(rets)
-        for idx,ret in enumerate(rets):
-            ret_dict['__ret_{}__'.format(idx)] = ret
-        func_esl.register(**ret_dict)
-        func_esl.dump()
+        cache.put(key,rets,kwargs)
         return tuple(rets) if len(rets) > 1 else rets[0]
     _decorated_func.__name_inner__ = func.__name__
+    _decorated_func.cache = cache
+    _decorated_func.cache_stats = cache.stats
     return _decorated_func
 
-def auto_load(func):
-    def _decorated_func(**kwargs):
-        func_esl = ESL.from_cluster(cluster_name=func.__name__,cluster_type='FUNC',load_data=True,auto_save=False,force_delete=False)
-        dv = func_esl.data_view()
-        ret_len = dv.inn.__ret_len__
-        ret_list = []
-        for idx in range(ret_len):
-            cur_id = '__ret_{}__'.format(idx)
-            is_found = False
-            for data_type in ESL.data_types():
-                obj_view =  getattr(dv,data_type)
-                if hasattr(obj_view,cur_id):
-                    ret_list.append(getattr(obj_view,cur_id))
-                    is_found=True
-                    break
-            if not is_found:
-                lg.warning('Not found the insufficient storage of current function.')
-                return None
-        return tuple(ret_list) if ret_len > 1 else ret_list[0]
-    _decorated_func.__name_inner__ = func.__name__
-    return _decorated_func
+def auto_save(func=None,async_save=False,max_entries=None,max_bytes=None,max_age=None):
+    '''
+        always run the function and save its results keyed by the call kwargs.
+        usage: @auto_save, or @auto_save(async_save=True,max_entries=100) with options.
+    '''
+    cache_kwargs = {'async_save':async_save,'max_entries':max_entries,'max_bytes':max_bytes,'max_age':max_age}
+    if func is None:
+        return lambda _func_: _cache_decorator(_func_,read_cache=False,**cache_kwargs)
+    return _cache_decorator(func,read_cache=False,**cache_kwargs)
+
+def auto_load(func=None,async_save=False,max_entries=None,max_bytes=None,max_age=None):
+    '''
+        load the saved results of the same call kwargs, or run the function and save its results on a miss.
+        usage: @auto_load, or @auto_load(max_bytes=1<<30) with options.
+    '''
+    cache_kwargs = {'async_save':async_save,'max_entries':max_entries,'max_bytes':max_bytes,'max_age':max_age}
+    if func is None:
+        return lambda _func_: _cache_decorator(_func_,read_cache=True,**cache_kwargs)
+    return _cache_decorator(func,read_cache=True,**cache_kwargs)
 
 '''
 Utils.
@@ -392,6 +1662,10 @@ class Utils:
     def register(**dict_data):
         ESL.from_cluster().register(**dict_data)
 
+    @staticmethod
+    def stats():
+        return ESL.from_cluster().stats()
+
     @staticmethod
     def data_view():
         return ESL.from_cluster().data_view()
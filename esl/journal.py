@@ -0,0 +1,105 @@
+import os
+import zlib
+import struct
+import threading
+import logging as lg
+import esl.util as util
+from collections import OrderedDict
+
+
+class Journal:
+    '''
+        append-only write-ahead journal of a cluster: groups of records (put or delete of a data, keyed by
+        "type/name") each closed by a commit record and made durable by a single fsync.
+        replay() returns the state of the committed groups, records of a torn or uncommitted tail are dropped.
+    '''
+    __MAGIC__ = b'ESLJRNL1'
+    __FILE__ = 'journal.log'
+    __RECORD__ = struct.Struct('<BHQI') # flag, key length, payload length, crc32 of key & payload.
+    __PUT__ = 1
+    __DEL__ = 0
+    __COMMIT__ = 2
+
+    def __init__(self,cluster_pwd):
+        self.cluster_pwd = cluster_pwd
+        self._lock = threading.Lock()
+
+    @classmethod
+    def s_path(cls,cluster_pwd):
+        return os.path.join(cluster_pwd,cls.__FILE__)
+
+    def path(self):
+        return self.__class__.s_path(self.cluster_pwd)
+
+    def size(self):
+        return os.path.getsize(self.path()) if os.path.exists(self.path()) else 0
+
+    def _encode(self,flag,key,payload=b''):
+        key = key.encode()
+        crc = zlib.crc32(payload,zlib.crc32(key))
+        return self.__RECORD__.pack(flag,len(key),len(payload),crc) + key
+
+    def commit(self,records):
+        '''
+            append a group of records (flag, key, payload) with its commit record and fsync once.
+        '''
+        with self._lock:
+            is_new = not os.path.exists(self.path())
+            with open(self.path(),'ab') as f:
+                if is_new:
+                    f.write(self.__MAGIC__)
+                for flag,key,payload in records:
+                    f.write(self._encode(flag,key,payload))
+                    f.write(payload)
+                f.write(self._encode(self.__COMMIT__,''))
+                f.flush()
+                os.fsync(f.fileno())
+            if is_new:
+                util.fsync_dir(self.cluster_pwd) # the entry of a new journal, else a crash may lose the whole file.
+
+    def replay(self):
+        '''
+            committed state of the journal: key -> payload, or None if deleted, in the order of the last writes.
+            the torn or uncommitted tail is truncated so that new groups follow the last commit.
+        '''
+        with self._lock:
+            if not os.path.exists(self.path()):
+                return OrderedDict()
+            with open(self.path(),'rb') as f:
+                buf = f.read()
+            if buf[:len(self.__MAGIC__)] != self.__MAGIC__:
+                lg.error('ESL journal {} destroyed.'.format(self.path()))
+                raise IOError
+            state,group = OrderedDict(),[]
+            pos = end = len(self.__MAGIC__)
+            rec_size = self.__RECORD__.size
+            while pos + rec_size <= len(buf):
+                flag,key_len,length,crc = self.__RECORD__.unpack_from(buf,pos)
+                key_end = pos + rec_size + key_len
+                if key_end + length > len(buf):
+                    break # torn tail of an interrupted write.
+                key,payload = buf[pos + rec_size:key_end],buf[key_end:key_end + length]
+                if zlib.crc32(payload,zlib.crc32(key)) != crc:
+                    break
+                pos = key_end + length
+                if flag == self.__COMMIT__:
+                    for rec_flag,rec_key,rec_payload in group:
+                        state.pop(rec_key,None)
+                        state[rec_key] = rec_payload if rec_flag == self.__PUT__ else None
+                    group,end = [],pos
+                else:
+                    group.append((flag,key.decode(),payload))
+            if end < len(buf):
+                lg.warning('ESL drops {} bytes of uncommitted records in journal {}'.format(len(buf) - end,self.path()))
+                with open(self.path(),'r+b') as f:
+                    f.truncate(end)
+                    os.fsync(f.fileno())
+            return state
+
+    def reset(self):
+        '''
+            drop all the records once they are folded into the cluster files.
+        '''
+        with self._lock:
+            if os.path.exists(self.path()):
+                os.remove(self.path())
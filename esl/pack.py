@@ -0,0 +1,208 @@
+import os
+import mmap
+import zlib
+import struct
+import threading
+import logging as lg
+
+
+class PackFile:
+    '''
+        single-file storage of a cluster: an append-only data file plus an append-only binary index
+        of records (save name -> offset, length, crc32), where the latest record of a save name wins.
+        each index record ends with the crc32 of itself, a torn or destroyed tail is truncated on opening.
+        overwritten or removed data stays in the data file until compact() is called.
+    '''
+    __MAGIC__ = b'ESLPIDX2'
+    __MAGIC_V1__ = b'ESLPIDX1' # former index without record crc, rewritten on opening.
+    __INDEX__ = 'pack.idx'
+    __RECORD__ = struct.Struct('<BHQQI') # flag, name length, offset, length, crc32 of the payload.
+    __RECORD_CRC__ = struct.Struct('<I') # crc32 of the record & name.
+    __PUT__ = 1
+    __DEL__ = 0
+
+    def __init__(self,cluster_pwd):
+        self.cluster_pwd = cluster_pwd
+        self.index = {}
+        self.data_name = None
+        self.n_dead = 0
+        self._lock = threading.RLock()
+        self._mmap = None
+        self._mmap_size = 0
+        self._read_index()
+
+    def index_path(self):
+        return os.path.join(self.cluster_pwd,self.__class__.__INDEX__)
+
+    def data_path(self):
+        return os.path.join(self.cluster_pwd,self.data_name)
+
+    def _read_index(self):
+        if not os.path.exists(self.index_path()):
+            self._write_header('pack-0.data')
+            return
+        with open(self.index_path(),'rb') as f:
+            buf = f.read()
+        magic = buf[:len(self.__MAGIC__)]
+        if magic not in [self.__MAGIC__,self.__MAGIC_V1__] or len(buf) < len(self.__MAGIC__) + 2:
+            lg.error('ESL pack index {} destroyed.'.format(self.index_path()))
+            raise IOError
+        pos = len(self.__MAGIC__)
+        name_len, = struct.unpack_from('<H',buf,pos)
+        self.data_name = buf[pos + 2:pos + 2 + name_len].decode()
+        pos += 2 + name_len
+        rec_size = self.__RECORD__.size
+        crc_size = self.__RECORD_CRC__.size if magic == self.__MAGIC__ else 0
+        while pos + rec_size <= len(buf):
+            flag,name_len,offset,length,crc = self.__RECORD__.unpack_from(buf,pos)
+            end = pos + rec_size + name_len + crc_size
+            if end > len(buf):
+                break # torn tail of an interrupted write.
+            if crc_size > 0 and self.__RECORD_CRC__.unpack_from(buf,end - crc_size)[0] != zlib.crc32(buf[pos:end - crc_size]):
+                break # destroyed record, nothing after it is trusted.
+            try:
+                save_name = buf[pos + rec_size:pos + rec_size + name_len].decode()
+            except UnicodeDecodeError:
+                break
+            pos = end
+            if save_name in self.index:
+                self.n_dead += 1
+            if flag == self.__PUT__:
+                self.index[save_name] = (offset,length,crc)
+            else:
+                self.index.pop(save_name,None)
+        if magic != self.__MAGIC__:
+            self._rewrite_index(self.data_name,self.index) # upgrade to records with crc.
+        elif pos < len(buf):
+            lg.warning('ESL truncates {} bytes of the torn tail of pack index {}'.format(len(buf) - pos,self.index_path()))
+            with open(self.index_path(),'r+b') as f:
+                f.truncate(pos)
+                os.fsync(f.fileno())
+
+    def _write_header(self,data_name):
+        self.data_name = data_name
+        name = data_name.encode()
+        with open(self.index_path(),'wb') as f:
+            f.write(self.__MAGIC__ + struct.pack('<H',len(name)) + name)
+        if not os.path.exists(self.data_path()):
+            open(self.data_path(),'wb').close()
+
+    def _rewrite_index(self,data_name,index):
+        # atomic replace of the index by the records of index.
+        tmp_index = self.index_path() + '.tmp'
+        name = data_name.encode()
+        with open(tmp_index,'wb') as f:
+            f.write(self.__MAGIC__ + struct.pack('<H',len(name)) + name)
+            for save_name,(offset,length,crc) in index.items():
+                self._append_record(self.__PUT__,save_name,offset,length,crc,f=f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_index,self.index_path())
+
+    def _append_record(self,flag,save_name,offset=0,length=0,crc=0,f=None):
+        name = save_name.encode()
+        rec = self.__RECORD__.pack(flag,len(name),offset,length,crc) + name
+        rec += self.__RECORD_CRC__.pack(zlib.crc32(rec))
+        if f is not None:
+            f.write(rec)
+            return
+        with open(self.index_path(),'ab') as f:
+            f.write(rec)
+
+    def put(self,save_name,payload):
+        with self._lock:
+            with open(self.data_path(),'ab') as f:
+                offset = f.tell()
+                f.write(payload)
+            crc = zlib.crc32(payload)
+            self._append_record(self.__PUT__,save_name,offset,len(payload),crc)
+            if save_name in self.index:
+                self.n_dead += 1
+            self.index[save_name] = (offset,len(payload),crc)
+
+    def sync(self):
+        '''
+            flush the data file and the index to the disk.
+        '''
+        with self._lock:
+            for path in [self.data_path(),self.index_path()]:
+                with open(path,'rb') as f:
+                    os.fsync(f.fileno())
+
+    def delete(self,save_name):
+        with self._lock:
+            if save_name not in self.index:
+                return
+            self._append_record(self.__DEL__,save_name)
+            del self.index[save_name]
+            self.n_dead += 1
+
+    def read(self,save_name,verify=True):
+        '''
+            read the payload of a save name with a single seek, None if missing or destroyed.
+        '''
+        if save_name not in self.index:
+            return None
+        offset,length,crc = self.index[save_name]
+        with open(self.data_path(),'rb') as f:
+            f.seek(offset)
+            payload = f.read(length)
+        if len(payload) != length or (verify and zlib.crc32(payload) != crc):
+            lg.warning('ESL pack data {} destroyed in {}'.format(save_name,self.data_path()))
+            return None
+        return payload
+
+    def view(self,save_name):
+        '''
+            zero-copy read-only memoryview of the payload on a memory map of the data file.
+        '''
+        if save_name not in self.index:
+            return None
+        offset,length,_ = self.index[save_name]
+        with self._lock:
+            if self._mmap is None or self._mmap_size < offset + length:
+                with open(self.data_path(),'rb') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    if size < offset + length:
+                        return None
+                    self._mmap = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+                    self._mmap_size = size
+            return memoryview(self._mmap)[offset:offset + length]
+
+    def dead_ratio(self):
+        n_total = self.n_dead + len(self.index)
+        return self.n_dead / n_total if n_total > 0 else 0.
+
+    def compact(self):
+        '''
+            rewrite the live payloads into a new data file and switch to it by an atomic replace of the index.
+        '''
+        with self._lock:
+            old_data_path = self.data_path()
+            seq = int(self.data_name[len('pack-'):-len('.data')]) + 1
+            new_data_name = 'pack-{}.data'.format(seq)
+            new_index = {}
+            with open(old_data_path,'rb') as src, open(os.path.join(self.cluster_pwd,new_data_name),'wb') as dst:
+                for save_name,(offset,length,crc) in self.index.items():
+                    src.seek(offset)
+                    new_index[save_name] = (dst.tell(),length,crc)
+                    dst.write(src.read(length))
+                dst.flush()
+                os.fsync(dst.fileno())
+            self._rewrite_index(new_data_name,new_index)
+            self._mmap = None # views already handed out keep the old map alive.
+            self._mmap_size = 0
+            self.data_name = new_data_name
+            self.index = new_index
+            self.n_dead = 0
+            os.remove(old_data_path)
+
+
+if __name__ == '__main__':
+    import sys
+    # usage: python -m esl.pack <cluster dir> ...
+    for cluster_pwd in sys.argv[1:]:
+        pack_file = PackFile(cluster_pwd)
+        dead_ratio = pack_file.dead_ratio()
+        pack_file.compact()
+        print('compacted {}, dead record ratio {:.2f}'.format(cluster_pwd,dead_ratio))
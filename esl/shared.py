@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import esl.util as util
+from contextlib import contextmanager
+from multiprocessing import shared_memory,resource_tracker
+
+np = util.lazy_import('numpy')
+tc = util.lazy_import('torch')
+
+_SEGMENTS = [] # opened segments, kept alive as long as the process since views on them may be handed out anywhere.
+
+
+class SharedCluster:
+    '''
+        numpy arrays and torch tensors (or state dicts of tensors) of a cluster published into shared memory segments,
+        so that the processes attaching to the cluster hold views on a single physical copy.
+        the manifest (shared.json in the cluster directory) records the segments and the pids attached to them,
+        the segments are unlinked when the last attached process detaches. pids of dead processes are dropped on
+        each attach / detach, so segments left by crashed processes are reclaimed by the next attach.
+    '''
+    __MANIFEST__ = 'shared.json'
+    __LOCK__ = 'shared.lock'
+
+    def __init__(self,cluster_pwd):
+        self.cluster_pwd = cluster_pwd
+        self.is_attached = False
+
+    def manifest_path(self):
+        return os.path.join(self.cluster_pwd,self.__class__.__MANIFEST__)
+
+    @classmethod
+    def is_supported(cls):
+        '''
+            whether the manifest can be locked on this platform, it is guarded by fcntl file locks (posix only).
+        '''
+        return util.is_module_available('fcntl')
+
+    @contextmanager
+    def _locked(self):
+        import fcntl # posix only, imported here so that esl still imports on windows.
+        with open(os.path.join(self.cluster_pwd,self.__class__.__LOCK__),'a') as f:
+            fcntl.flock(f.fileno(),fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(),fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.manifest_path(),'r') as f:
+                return json.load(f)
+        except (IOError,ValueError):
+            return None
+
+    def _write(self,manifest):
+        tmp_path = '{}.{}.tmp'.format(self.manifest_path(),os.getpid())
+        with open(tmp_path,'w') as f:
+            json.dump(manifest,f)
+        os.replace(tmp_path,self.manifest_path())
+
+    @classmethod
+    def _is_alive(cls,pid):
+        try:
+            os.kill(pid,0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    @classmethod
+    def _open(cls,name,size=0,create=False):
+        seg = shared_memory.SharedMemory(name=name,create=create,size=size)
+        try:
+            resource_tracker.unregister(seg._name,'shared_memory') # lifetime is managed by the manifest refs.
+        except Exception:
+            pass
+        _SEGMENTS.append(seg)
+        return seg
+
+    @classmethod
+    def _unlink(cls,manifest):
+        for entry in manifest['entries'].values():
+            for _,seg_name,_,_ in entry['arrays']:
+                try:
+                    seg = shared_memory.SharedMemory(name=seg_name)
+                except FileNotFoundError:
+                    continue
+                seg.close()
+                seg.unlink() # also drops the registration of the opening above.
+
+    @classmethod
+    def arrays_of(cls,data):
+        '''
+            list of (key, numpy array) sharing the memory of data, None if data can not be published.
+        '''
+        if isinstance(data,np.ndarray):
+            return None if data.dtype.hasobject else [('',data)]
+        try:
+            if util.check_type(data,'torch','Tensor'):
+                return [('',data.detach().cpu().contiguous().numpy())]
+            if isinstance(data,dict) and len(data) > 0 and all(util.check_type(v,'torch','Tensor') for v in data.values()):
+                return [(k,v.detach().cpu().contiguous().numpy()) for k,v in data.items()]
+        except (TypeError,RuntimeError):
+            return None # e.g. bfloat16 tensors have no numpy dtype.
+        return None
+
+    def _publish(self,tokens,fetch):
+        prefix = 'esl{}_{}'.format(os.getpid(),hashlib.blake2b(
+            '{}{}'.format(os.path.abspath(self.cluster_pwd),time.time()).encode(),digest_size=4).hexdigest())
+        entries,n_seg = {},0
+        for key,token in tokens.items():
+            data = fetch(*key)
+            arrays = self.__class__.arrays_of(data)
+            if arrays is None:
+                continue
+            entry = {'kind':'dict' if isinstance(data,dict) else 'array','token':token,'arrays':[]}
+            for sub_key,array in arrays:
+                seg_name = '{}_{}'.format(prefix,n_seg)
+                n_seg += 1
+                seg = self.__class__._open(seg_name,size=max(array.nbytes,1),create=True)
+                np.ndarray(array.shape,dtype=array.dtype,buffer=seg.buf)[...] = array
+                entry['arrays'].append([sub_key,seg_name,list(array.shape),np.lib.format.dtype_to_descr(array.dtype)])
+            entries['{}/{}'.format(*key)] = entry
+        return {'owner':os.getpid(),'refs':[],'entries':entries}
+
+    def attach(self,tokens,fetch):
+        '''
+            attach this process to the shared data of the cluster, publish it first if no live process shares it.
+        :param tokens: (data type, data name) -> token of the stored content, shared data of a different token is ignored.
+        :param fetch: function of (data type, data name) returning the data to publish.
+        :return: (data type, data name) -> zero-copy view, numpy arrays are read-only.
+        '''
+        with self._locked():
+            manifest = self._read()
+            if manifest is not None:
+                manifest['refs'] = [pid for pid in manifest['refs'] if self.__class__._is_alive(pid)]
+                if len(manifest['refs']) == 0:
+                    self.__class__._unlink(manifest) # left by crashed processes.
+                    manifest = None
+            if manifest is None:
+                manifest = self._publish(tokens,fetch)
+            manifest['refs'].append(os.getpid())
+            self._write(manifest)
+            self.is_attached = True
+            atexit.register(self.detach)
+        views = {}
+        for entry_key,entry in manifest['entries'].items():
+            data_type,data_name = entry_key.split('/',1)
+            if tokens.get((data_type,data_name)) != entry['token']:
+                continue
+            arrays = []
+            for sub_key,seg_name,shape,descr in entry['arrays']:
+                seg = self.__class__._open(seg_name)
+                array = np.ndarray(shape,dtype=np.lib.format.descr_to_dtype(descr),buffer=seg.buf)
+                if data_type == 'np':
+                    array.flags.writeable = False
+                arrays.append((sub_key,array if data_type == 'np' else tc.from_numpy(array)))
+            views[(data_type,data_name)] = dict(arrays) if entry['kind'] == 'dict' else arrays[0][1]
+        return views
+
+    def detach(self):
+        '''
+            drop the reference of this process, the segments are unlinked by the last process.
+            the views already handed out stay valid until they are released.
+        '''
+        if not self.is_attached:
+            return
+        self.is_attached = False
+        with self._locked():
+            manifest = self._read()
+            if manifest is None:
+                return
+            if os.getpid() in manifest['refs']:
+                manifest['refs'].remove(os.getpid())
+            manifest['refs'] = [pid for pid in manifest['refs'] if self.__class__._is_alive(pid)]
+            if len(manifest['refs']) > 0:
+                self._write(manifest)
+                return
+            self.__class__._unlink(manifest)
+            os.remove(self.manifest_path())
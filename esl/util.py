@@ -1,6 +1,177 @@
 from _ctypes import PyObj_FromPtr
 from esl import *
+import importlib
+import importlib.util
+import sys
+import types
+import struct
+import pickle
+import hashlib
+import os
 
 
+def is_module_available(module_name):
+    '''
+        check if an optional dependency is installed without importing it.
+    '''
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError,ValueError):
+        return False
 
 
+class LazyModule(types.ModuleType):
+    '''
+        proxy of a heavy third-party module, the module is really imported on the first attribute access.
+    '''
+    def __init__(self,module_name):
+        super(LazyModule, self).__init__(module_name)
+
+    def __getattr__(self, item):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module,item)
+
+    def __repr__(self):
+        return '<lazy module {}>'.format(self.__name__)
+
+
+def lazy_import(module_name):
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    return LazyModule(module_name)
+
+
+def check_type(data,module_name,type_name,exact=False):
+    '''
+        check the type of data against a third-party type without importing its module,
+        no data could be an instance of a module that has never been imported.
+    '''
+    module = sys.modules.get(module_name)
+    if module is None:
+        return False
+    data_cls = getattr(module,type_name,None)
+    if data_cls is None:
+        return False
+    return type(data) is data_cls if exact else isinstance(data,data_cls)
+
+
+def stable_hash(obj):
+    '''
+        hash of the content of obj stable across processes, arrays, tensors and data frames are hashed by their buffers.
+        raise TypeError for objects that can not be hashed by content, e.g. the ones that can not be pickled.
+    '''
+    hasher = hashlib.blake2b(digest_size=16)
+    _update_hash(hasher,obj)
+    return hasher.hexdigest()
+
+
+def fingerprint(obj):
+    '''
+        content fingerprint of a data to detect changes, None if the content can not be hashed reliably.
+    '''
+    try:
+        return stable_hash(obj)
+    except TypeError:
+        return None
+
+
+def _update_hash(hasher,obj):
+    hasher.update(type(obj).__name__.encode())
+    if obj is None or type(obj) in [bool,int,float,complex]:
+        hasher.update(repr(obj).encode())
+    elif type(obj) is str:
+        hasher.update(struct.pack('<q',len(obj)) + obj.encode('utf-8','surrogatepass'))
+    elif type(obj) in [bytes,bytearray]:
+        hasher.update(struct.pack('<q',len(obj)) + bytes(obj))
+    elif type(obj) in [list,tuple]:
+        hasher.update(struct.pack('<q',len(obj)))
+        for ele in obj:
+            _update_hash(hasher,ele)
+    elif type(obj) in [set,frozenset]:
+        hasher.update(struct.pack('<q',len(obj)))
+        for ele_hash in sorted(stable_hash(ele) for ele in obj):
+            hasher.update(ele_hash.encode())
+    elif type(obj) is dict:
+        hasher.update(struct.pack('<q',len(obj)))
+        for key_hash,value in sorted((stable_hash(key),value) for key,value in obj.items()):
+            hasher.update(key_hash.encode())
+            _update_hash(hasher,value)
+    elif check_type(obj,'numpy','ndarray'):
+        np = sys.modules['numpy']
+        hasher.update('{}{}'.format(obj.dtype.str,obj.shape).encode())
+        if obj.dtype.hasobject:
+            _update_hash(hasher,obj.tolist())
+        else:
+            hasher.update(np.ascontiguousarray(obj).data)
+    elif check_type(obj,'torch','Tensor'):
+        tensor = obj.detach().cpu().contiguous()
+        hasher.update('{}{}'.format(tensor.dtype,tuple(tensor.shape)).encode())
+        _update_hash(hasher,tensor.reshape(-1).view(sys.modules['torch'].uint8).numpy())
+    elif check_type(obj,'pandas','DataFrame') or check_type(obj,'pandas','Series'):
+        pd = sys.modules['pandas']
+        if check_type(obj,'pandas','DataFrame'):
+            labels,dtypes = list(obj.columns),[str(dtype) for dtype in obj.dtypes]
+        else:
+            labels,dtypes = [obj.name],[str(obj.dtype)]
+        hasher.update(pickle.dumps((labels,dtypes)))
+        try:
+            _update_hash(hasher,pd.util.hash_pandas_object(obj,index=True).to_numpy())
+        except TypeError: # unhashable cells, e.g. lists.
+            _update_hash(hasher,pickle.dumps(obj,protocol=4))
+    else:
+        try:
+            hasher.update(pickle.dumps(obj,protocol=4))
+        except Exception:
+            raise TypeError('unable to hash {} by content'.format(type(obj))) # repr may embed addresses, never a stable key.
+
+
+def fsync_path(path):
+    '''
+        flush a file, or a directory with all the files in it, to the disk.
+    '''
+    if os.path.isdir(path):
+        for sub_dir,_,file_names in os.walk(path):
+            for file_name in file_names:
+                fsync_path(os.path.join(sub_dir,file_name))
+            fsync_dir(sub_dir)
+        return
+    with open(path,'rb') as f:
+        os.fsync(f.fileno())
+
+
+def fsync_dir(path):
+    '''
+        flush the entries of a directory (e.g. a rename into it) to the disk.
+    '''
+    fd = os.open(path,os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sizeof(obj):
+    '''
+        approximate memory size of obj in bytes.
+    '''
+    if check_type(obj,'numpy','ndarray'):
+        return int(obj.nbytes)
+    elif check_type(obj,'torch','Tensor'):
+        return obj.element_size() * obj.nelement()
+    elif check_type(obj,'pandas','DataFrame'):
+        return int(obj.memory_usage(index=True,deep=False).sum())
+    elif check_type(obj,'networkx','Graph'):
+        return 64 * (obj.number_of_nodes() + obj.number_of_edges())
+    elif check_type(obj,'dgl','DGLGraph'):
+        size = 16 * obj.num_edges()
+        for frame in [obj.ndata,obj.edata]:
+            for key in frame:
+                value = frame[key]
+                size += sizeof(value) if not isinstance(value,dict) else sum(sizeof(ele) for ele in value.values())
+        return size
+    elif type(obj) in [list,tuple,set,frozenset]:
+        return sys.getsizeof(obj) + sum(sizeof(ele) for ele in obj)
+    elif type(obj) is dict:
+        return sys.getsizeof(obj) + sum(sizeof(key) + sizeof(value) for key,value in obj.items())
+    return sys.getsizeof(obj)
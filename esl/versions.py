@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging as lg
+import esl.util as util
+
+np = util.lazy_import('numpy')
+tc = util.lazy_import('torch')
+
+
+class VersionStore:
+    '''
+        version history of the data of a cluster. each commit of changed data gets a new version id of the cluster,
+        and each version of a data is a manifest of content-addressed chunks of its bytes (the raw buffer of arrays &
+        tensors, the joint payload of the others), so the chunks unchanged between versions are stored once.
+        a removed data gets a tombstone version. unreferenced chunks are deleted when versions are pruned.
+    '''
+    __DIR__ = '.versions'
+    __HEAD__ = 'head.json'
+    __CHUNK__ = 1 << 20 # bytes of a chunk.
+
+    def __init__(self,cluster_pwd):
+        self.root = os.path.join(cluster_pwd,self.__class__.__DIR__)
+        self._lock = threading.RLock()
+
+    def _index_path(self,data_type,data_name):
+        return os.path.join(self.root,'{}-{}.json'.format(data_type,data_name))
+
+    def _chunk_path(self,chunk_key):
+        return os.path.join(self.root,'chunks',chunk_key[:2],chunk_key)
+
+    def _read_json(self,path,default):
+        if not os.path.exists(path):
+            return default
+        with open(path,'r') as f:
+            return json.load(f)
+
+    def _write_json(self,path,obj):
+        with open(path + '.tmp','w') as f:
+            json.dump(obj,f)
+        os.replace(path + '.tmp',path)
+
+    def head(self):
+        '''
+            latest version id of the cluster, 0 if nothing is versioned yet.
+        '''
+        return self._read_json(os.path.join(self.root,self.__class__.__HEAD__),{'version':0})['version']
+
+    def history(self,data_type,data_name):
+        '''
+            versions of a data from the oldest: dicts of version, time and bytes (None for removal).
+        '''
+        return [{'version':record['version'],'time':record['time'],
+                 'bytes':None if record['manifest'] is None else record['manifest']['bytes']}
+                for record in self._read_json(self._index_path(data_type,data_name),[])]
+
+    def _put_chunks(self,buf):
+        chunk_keys = []
+        for offset in range(0,len(buf),self.__class__.__CHUNK__):
+            chunk = buf[offset:offset + self.__class__.__CHUNK__]
+            chunk_key = hashlib.blake2b(chunk,digest_size=16).hexdigest()
+            chunk_path = self._chunk_path(chunk_key)
+            if not os.path.exists(chunk_path):
+                os.makedirs(os.path.dirname(chunk_path),exist_ok=True)
+                tmp_path = '{}.{}.tmp'.format(chunk_path,os.getpid())
+                with open(tmp_path,'wb') as f:
+                    f.write(chunk)
+                os.replace(tmp_path,chunk_path)
+            chunk_keys.append(chunk_key)
+        return chunk_keys
+
+    def _get_chunks(self,chunk_keys):
+        buf = bytearray()
+        for chunk_key in chunk_keys:
+            with open(self._chunk_path(chunk_key),'rb') as f:
+                buf += f.read()
+        return buf
+
+    @classmethod
+    def _as_array(cls,data):
+        # the numpy view of an array or tensor to chunk by its raw buffer, None for the data chunked by its payload.
+        try:
+            if isinstance(data,np.ndarray) and not data.dtype.hasobject:
+                return np.ascontiguousarray(data)
+            if util.check_type(data,'torch','Tensor'):
+                return data.detach().cpu().contiguous().numpy()
+        except (TypeError,RuntimeError):
+            pass # e.g. bfloat16 tensors have no numpy dtype.
+        return None
+
+    def _manifest(self,wrp):
+        array = self.__class__._as_array(wrp.data)
+        if array is not None:
+            buf = memoryview(array.reshape(-1)).cast('B') if array.size > 0 else b''
+            return {'kind':'array','shape':list(array.shape),'descr':np.lib.format.dtype_to_descr(array.dtype),
+                    'bytes':len(buf),'chunks':self._put_chunks(buf)}
+        payload = wrp.to_bytes()
+        return {'kind':'payload','bytes':len(payload),'chunks':self._put_chunks(payload)}
+
+    def commit(self,wrps,removed=()):
+        '''
+            record the data of wrappers (and the removal of (data type, data name) in removed) as a new version,
+            data unchanged since its last version is skipped. return the new version id, None if nothing changed.
+        :param wrps: (data type, wrapper) pairs, the wrappers support joint storage.
+        '''
+        with self._lock:
+            os.makedirs(self.root,exist_ok=True)
+            version,cur_time = self.head() + 1,time.time()
+            changes = []
+            for data_type,wrp in wrps:
+                manifest = self._manifest(wrp)
+                changes.append((data_type,wrp.data_name,manifest))
+            for data_type,data_name in removed:
+                changes.append((data_type,data_name,None))
+            is_changed = False
+            for data_type,data_name,manifest in changes:
+                index_path = self._index_path(data_type,data_name)
+                records = self._read_json(index_path,[])
+                if len(records) > 0 and records[-1]['manifest'] == manifest:
+                    continue
+                if len(records) == 0 and manifest is None:
+                    continue
+                seq = records[-1].get('seq',len(records) - 1) + 1 if len(records) > 0 else 0 # version index of the data.
+                records.append({'version':version,'seq':seq,'time':cur_time,'manifest':manifest})
+                self._write_json(index_path,records)
+                is_changed = True
+            if not is_changed:
+                return None
+            self._write_json(os.path.join(self.root,self.__class__.__HEAD__),{'version':version})
+            return version
+
+    def state(self,version=None,as_of=None):
+        '''
+            (data type, data name) -> (version, manifest) of the data in the cluster at a version or a timestamp.
+        '''
+        state = {}
+        if not os.path.isdir(self.root):
+            return state
+        for file_name in os.listdir(self.root):
+            if not file_name.endswith('.json') or file_name == self.__class__.__HEAD__:
+                continue
+            data_type,data_name = file_name[:-len('.json')].split('-',1)
+            records = [record for record in self._read_json(os.path.join(self.root,file_name),[])
+                       if (version is None or record['version'] <= version) and (as_of is None or record['time'] <= as_of)]
+            if len(records) > 0 and records[-1]['manifest'] is not None:
+                state[(data_type,data_name)] = (records[-1]['version'],records[-1]['manifest'])
+        return state
+
+    def read(self,_wrap_class_,data_name,manifest,cluster_pwd):
+        '''
+            restore a data from its manifest, only its own chunks are read.
+        '''
+        buf = self._get_chunks(manifest['chunks'])
+        if manifest['kind'] == 'payload':
+            return _wrap_class_.from_bytes(data_name=data_name,cluster_pwd=cluster_pwd,payload=bytes(buf)).data
+        array = np.frombuffer(buf,dtype=np.lib.format.descr_to_dtype(manifest['descr'])).reshape(manifest['shape'])
+        return tc.from_numpy(array) if _wrap_class_.type_id() == 'tc' else array
+
+    def prune(self,keep_last=None,keep_every=None):
+        '''
+            drop the versions of each data beyond its latest keep_last ones (all but the latest if None), except every
+            keep_every-th version of the data counted from its first one, then delete the chunks no longer referenced.
+            the latest version is always kept. return the number of versions dropped.
+        '''
+        if keep_last is None and keep_every is None:
+            return 0
+        with self._lock:
+            if not os.path.isdir(self.root):
+                return 0
+            n_drop,chunk_keys = 0,set()
+            for file_name in os.listdir(self.root):
+                if not file_name.endswith('.json') or file_name == self.__class__.__HEAD__:
+                    continue
+                index_path = os.path.join(self.root,file_name)
+                records = self._read_json(index_path,[])
+                n_keep = 1 if keep_last is None else max(keep_last,1)
+                kept = [record for idx,record in enumerate(records) if idx >= len(records) - n_keep or
+                        (keep_every is not None and record.get('seq',idx) % keep_every == 0)]
+                if len(kept) < len(records):
+                    n_drop += len(records) - len(kept)
+                    self._write_json(index_path,kept)
+                for record in kept:
+                    if record['manifest'] is not None:
+                        chunk_keys.update(record['manifest']['chunks'])
+            if n_drop > 0:
+                chunk_dir = os.path.join(self.root,'chunks')
+                for sub_dir in os.listdir(chunk_dir):
+                    for chunk_key in os.listdir(os.path.join(chunk_dir,sub_dir)):
+                        if chunk_key not in chunk_keys and not chunk_key.endswith('.tmp'):
+                            os.remove(os.path.join(chunk_dir,sub_dir,chunk_key))
+                lg.debug('ESL pruned %d versions in %s',n_drop,self.root)
+            return n_drop
@@ -1,18 +1,44 @@
+import io
 import os
+import sys
+import array
+import mmap
+import copy
 import json
+import zlib
+import struct
+import pickle
+import shutil
+import base64
+import operator
+import itertools
 import logging as lg
-import numpy as np
-import pandas as pd
-import json
-import torch as tc
-import dgl
-import networkx as nx
+import esl.util as util
+from collections import OrderedDict
+from esl.chunked import ChunkedArray
+# heavy backends are imported on demand.
+np = util.lazy_import('numpy')
+pd = util.lazy_import('pandas')
+tc = util.lazy_import('torch')
+dgl = util.lazy_import('dgl')
+nx = util.lazy_import('networkx')
 
 class Wrapper:
     def __init__(self,data,data_name,cluster_pwd):
         self.data = data
         self.data_name = data_name
         self.cluster_pwd=cluster_pwd
+        self.sync = False # flush the written files to the disk before they replace the old ones, e.g. by a checkpoint.
+
+    def _replace(self,tmp_path,path):
+        '''
+            move a file (or directory) written aside into place.
+        '''
+        if self.sync:
+            util.fsync_path(tmp_path)
+        os.replace(tmp_path,path)
+        if self.sync:
+            util.fsync_dir(os.path.dirname(path)) # the rename itself.
 
     def dump(self):
         raise NotImplementedError
@@ -33,50 +59,387 @@ class Wrapper:
         return lst
 
     @classmethod
-    def load(cls,save_name,cluster_pwd):
+    def load(cls,save_name,cluster_pwd,**kwargs):
         raise NotImplementedError
 
     @classmethod
     def type_id(cls):
         return 'RAW'
 
+    @classmethod
+    def snapshot(cls,data):
+        '''
+            a copy of data that is safe to write in background while the origin is modified.
+        '''
+        return copy.deepcopy(data)
+
+    def to_bytes(self):
+        '''
+            serialize the data into one payload, required if is_support_joint.
+        '''
+        raise NotImplementedError
+
+    @classmethod
+    def from_bytes(cls,data_name,cluster_pwd,payload,**kwargs):
+        '''
+            restore a wrapper from the payload of to_bytes, required if is_support_joint.
+        '''
+        raise NotImplementedError
+
     @classmethod
     def is_support_joint(cls):
+        '''
+            if the data can be stored jointly with others in a single file by to_bytes / from_bytes.
+        '''
+        return False
+
+    def dump_bytes(self,payload):
+        '''
+            store the payload of to_bytes as the file of dump, so the data serialized already is not serialized again.
+            return False if the file can not be written from the payload, then dump is needed.
+        '''
         return False
 
+    def _write_payload(self,payload):
+        with open(self.pwd() + '.tmp','wb') as f:
+            f.write(payload)
+        self._replace(self.pwd() + '.tmp',self.pwd())
+
+    def to_inline(self,max_bytes):
+        '''
+            a json value of the data to be stored in the cluster info, None if larger than max_bytes or not cheap to encode.
+        '''
+        raise NotImplementedError
+
+    @classmethod
+    def from_inline(cls,data_name,cluster_pwd,value,**kwargs):
+        raise NotImplementedError
+
     @classmethod
     def is_support_inline(cls):
+        '''
+            if small data can be stored inside the cluster info by to_inline / from_inline.
+        '''
         return False
 
+    def is_chunked(self):
+        '''
+            if the data is a chunked array written in place, never stored inline or packed.
+        '''
+        return isinstance(self.data,ChunkedArray)
+
+
+class LazyData:
+    '''
+        placeholder of the data still on the disk, materialized by the owner cluster on its first access.
+    '''
+    def __init__(self,owner,data_type,data_name):
+        self.owner = owner
+        self.data_type = data_type
+        self.data_name = data_name
+
+    def materialize(self):
+        return self.owner._fetch(self.data_type,self.data_name)
+
+    def __repr__(self):
+        return 'LazyData({}-{})'.format(self.data_type,self.data_name)
+
+
+class PackedList:
+    '''
+        a long list of ints (within int64) or floats only, stored by InnerWrapper.encode as one contiguous typed buffer.
+    '''
+    __MIN_LEN__ = 64
+
+    def __init__(self,typecode,buf):
+        self.typecode = typecode
+        self.buf = buf
+
+    @classmethod
+    def pack(cls,lst):
+        '''
+            the PackedList of lst, None if lst is short or not homogeneous.
+        '''
+        if len(lst) < cls.__MIN_LEN__ or type(lst[0]) not in [int,float]:
+            return None
+        item_type = type(lst[0])
+        if not all(type(item) is item_type for item in lst):
+            return None
+        try:
+            buf = array.array('q' if item_type is int else 'd',lst)
+        except OverflowError:
+            return None
+        if sys.byteorder == 'big':
+            buf.byteswap() # stored little-endian.
+        return PackedList(buf.typecode,buf.tobytes())
+
+    def __reduce__(self):
+        return _unpack_list,(self.typecode,self.buf)
+
+
+def _unpack_list(typecode,buf):
+    lst = array.array(typecode)
+    lst.frombytes(buf)
+    if sys.byteorder == 'big':
+        lst.byteswap()
+    return lst.tolist()
+
 
 class InnerWrapper(Wrapper):
+    '''
+        python values stored in a typed binary encoding, msgpack if installed or else pickle protocol 5:
+        tuples, sets, bytes and non-str dict keys round-trip exactly, and long numeric lists are packed into typed buffers.
+        the json files of the former versions are still loaded.
+    '''
+    __MAGIC__ = b'ESLINN1'
+    __CONTAINERS__ = [list,dict,tuple]
+    __LINES_MAGIC__ = b'ESLINL1'
+    __LINES_RECORD__ = struct.Struct('<QI') # payload length, crc32 of the payload of an appended batch.
+
     def __init__(self,**kwargs):
         super(InnerWrapper, self).__init__(**kwargs)
 
     def dump(self):
-        with open(self.pwd(),'w') as f:
-            json.dump(self.data,f)
+        # write aside and replace, a crash never leaves a torn file.
+        with open(self.pwd() + '.tmp','wb') as f:
+            f.write(self.encode(self.data))
+        self._replace(self.pwd() + '.tmp',self.pwd())
 
     def save_path(self):
-        return '{}.json'.format(self.save_name())
+        return '{}.bin'.format(self.save_name())
+
+    def legacy_path(self):
+        return os.path.join(self.cluster_pwd,'{}.json'.format(self.save_name()))
+
+    @classmethod
+    def _pack_tree(cls,obj):
+        if type(obj) is list:
+            packed = PackedList.pack(obj)
+            if packed is not None:
+                return packed
+            if not any(type(item) in cls.__CONTAINERS__ for item in obj):
+                return obj
+            return [cls._pack_tree(item) for item in obj]
+        elif type(obj) is dict:
+            return {key:cls._pack_tree(value) if type(value) in cls.__CONTAINERS__ else value for key,value in obj.items()}
+        elif type(obj) is tuple:
+            return tuple(cls._pack_tree(item) for item in obj)
+        return obj
+
+    @classmethod
+    def _msgpack_default(cls,obj):
+        msgpack = util.lazy_import('msgpack')
+        if type(obj) is PackedList:
+            return msgpack.ExtType(1,obj.typecode.encode() + obj.buf)
+        elif type(obj) is tuple:
+            return msgpack.ExtType(2,cls._packb(list(obj)))
+        elif type(obj) is set:
+            return msgpack.ExtType(3,cls._packb(list(obj)))
+        elif type(obj) is frozenset:
+            return msgpack.ExtType(4,cls._packb(list(obj)))
+        elif type(obj) is int:
+            return msgpack.ExtType(5,str(obj).encode()) # beyond 64 bits.
+        return msgpack.ExtType(6,pickle.dumps(obj,protocol=5)) # any other picklable object.
+
+    @classmethod
+    def _msgpack_ext(cls,code,data):
+        if code == 1:
+            return _unpack_list(data[:1].decode(),data[1:])
+        elif code == 2:
+            return tuple(cls._unpackb(data))
+        elif code == 3:
+            return set(cls._unpackb(data))
+        elif code == 4:
+            return frozenset(cls._unpackb(data))
+        elif code == 5:
+            return int(data.decode())
+        elif code == 6:
+            return pickle.loads(data)
+        return util.lazy_import('msgpack').ExtType(code,data)
+
+    @classmethod
+    def _packb(cls,obj):
+        return util.lazy_import('msgpack').packb(obj,default=cls._msgpack_default,strict_types=True,use_bin_type=True)
+
+    @classmethod
+    def _unpackb(cls,buf):
+        return util.lazy_import('msgpack').unpackb(buf,ext_hook=cls._msgpack_ext,raw=False,strict_map_key=False)
+
+    @classmethod
+    def encode(cls,data):
+        obj = cls._pack_tree(data)
+        if util.is_module_available('msgpack'):
+            return cls.__MAGIC__ + b'M' + cls._packb(obj)
+        return cls.__MAGIC__ + b'P' + pickle.dumps(obj,protocol=5)
+
+    @classmethod
+    def decode(cls,buf):
+        '''
+            restore the data of encode, or of the json of the former versions.
+        '''
+        buf = bytes(buf)
+        if not buf.startswith(cls.__MAGIC__):
+            return json.loads(buf.decode())
+        backend,body = buf[len(cls.__MAGIC__):len(cls.__MAGIC__) + 1],buf[len(cls.__MAGIC__) + 1:]
+        if backend == b'P':
+            return pickle.loads(body)
+        if not util.is_module_available('msgpack'):
+            lg.error('ESL inner data is encoded by msgpack, plz install msgpack.')
+            raise ImportError
+        return cls._unpackb(body)
 
     @classmethod
-    def load(cls, save_name, cluster_pwd):
+    def load(cls, save_name, cluster_pwd, stream=None, **kwargs):
+        '''
+        :param stream: if the data is stored appended (see ESL.append), None to read it only if no whole file exists.
+        '''
         data_type,data_name = cls.decode_save_name(save_name=save_name)
         assert data_type == cls.type_id()
         wrp = InnerWrapper(data=None,data_name=data_name,cluster_pwd=cluster_pwd)
-        if not os.path.exists(wrp.pwd()):
+        if stream is None:
+            stream = not os.path.exists(wrp.pwd()) and not os.path.exists(wrp.legacy_path())
+        if stream:
+            stream_paths = [path for path in [cls.stream_path(cluster_pwd,save_name),cls.legacy_stream_path(cluster_pwd,save_name)]
+                            if os.path.exists(path)]
+            if len(stream_paths) == 0:
+                lg.warning('No data found by data type {}, data name {}'.format(data_type,data_name))
+                return None
+            wrp.data = list(cls.iter_lines(stream_paths[0]))
+            return wrp
+        path = wrp.pwd() if os.path.exists(wrp.pwd()) else wrp.legacy_path()
+        if not os.path.exists(path):
             lg.warning('No data found by data type {}, data name {}'.format(data_type,data_name))
             return None
         try:
-            with open(wrp.pwd(),'r') as f:
-                load_dict = json.load(f)
-        except IOError:
+            with open(path,'rb') as f:
+                wrp.data = cls.decode(f.read())
+        except (IOError,ValueError,pickle.UnpicklingError,EOFError):
             lg.warning('data destroyed by data type {}, data name {}'.format(data_type, data_name))
             return None
-        wrp.data = load_dict
         return wrp
 
+    def to_bytes(self):
+        return self.encode(self.data)
+
+    def dump_bytes(self,payload):
+        self._write_payload(payload)
+        return True
+
+    @classmethod
+    def from_bytes(cls,data_name,cluster_pwd,payload,**kwargs):
+        return InnerWrapper(data=cls.decode(payload),data_name=data_name,cluster_pwd=cluster_pwd)
+
+    @classmethod
+    def is_support_joint(cls):
+        return True
+
+    def to_inline(self,max_bytes):
+        # only the values json keeps exactly, e.g. no tuples, sets or int keys.
+        try:
+            value = json.dumps(self.data)
+        except (TypeError,ValueError):
+            return None
+        if len(value) > max_bytes or json.loads(value) != self.data:
+            return None
+        return {'value':self.data}
+
+    @classmethod
+    def from_inline(cls,data_name,cluster_pwd,value,**kwargs):
+        return InnerWrapper(data=value['value'],data_name=data_name,cluster_pwd=cluster_pwd)
+
+    @classmethod
+    def is_support_inline(cls):
+        return True
+
+    @classmethod
+    def stream_path(cls,cluster_pwd,save_name):
+        return os.path.join(cluster_pwd,'{}.lines'.format(save_name))
+
+    @classmethod
+    def legacy_stream_path(cls,cluster_pwd,save_name):
+        return os.path.join(cluster_pwd,'{}.jsonl'.format(save_name))
+
+    @classmethod
+    def encode_lines(cls,items):
+        '''
+            a record of the appended items, each batch is encoded as a whole list by encode.
+        '''
+        payload = cls.encode(list(items))
+        return cls.__LINES_RECORD__.pack(len(payload),zlib.crc32(payload)) + payload
+
+    @classmethod
+    def write_lines(cls,path,items):
+        '''
+            write the items as a new lines file, aside and renamed, so a failure never touches the existing file.
+        '''
+        record = cls.encode_lines(items)
+        with open(path + '.tmp','wb') as f:
+            f.write(cls.__LINES_MAGIC__)
+            f.write(record)
+        os.replace(path + '.tmp',path)
+
+    @classmethod
+    def append_lines(cls,path,items):
+        '''
+            append the items to a lines file, the torn record of an interrupted append is cut off first.
+            the items are encoded before the file is touched.
+        '''
+        if not os.path.exists(path):
+            cls.write_lines(path,items)
+            return
+        record = cls.encode_lines(items)
+        with open(path,'rb+') as f:
+            end = cls._lines_end(f)
+            f.seek(end)
+            f.truncate()
+            f.write(record)
+
+    @classmethod
+    def _lines_end(cls,f):
+        # end of the last complete record, found by the record headers only.
+        size = f.seek(0,os.SEEK_END)
+        pos = len(cls.__LINES_MAGIC__)
+        rec_size = cls.__LINES_RECORD__.size
+        while pos + rec_size <= size:
+            f.seek(pos)
+            length,_ = cls.__LINES_RECORD__.unpack(f.read(rec_size))
+            if pos + rec_size + length > size:
+                break
+            pos += rec_size + length
+        return pos
+
+    @classmethod
+    def iter_lines(cls,path):
+        '''
+            items of a lines file, or of the json lines of the former versions.
+        '''
+        if path.endswith('.jsonl'):
+            with open(path,'r') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        lg.warning('ESL skips the torn tail of json lines {}'.format(path))
+                        return
+            return
+        with open(path,'rb') as f:
+            if f.read(len(cls.__LINES_MAGIC__)) != cls.__LINES_MAGIC__:
+                lg.error('ESL lines file {} destroyed.'.format(path))
+                raise IOError
+            rec_size = cls.__LINES_RECORD__.size
+            while True:
+                header = f.read(rec_size)
+                if len(header) < rec_size:
+                    if len(header) > 0:
+                        lg.warning('ESL skips the torn tail of lines {}'.format(path))
+                    return
+                length,crc = cls.__LINES_RECORD__.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    lg.warning('ESL skips the torn tail of lines {}'.format(path))
+                    return
+                yield from cls.decode(payload)
+
     @classmethod
     def type_id(cls):
         return 'inner'
@@ -88,52 +451,317 @@ class NumpyWrapper(Wrapper):
         super(NumpyWrapper, self).__init__(**kwargs)
 
     def dump(self):
-        np.save(self.pwd(),self.data)
+        if self.is_chunked():
+            if os.path.abspath(self.data.path) != os.path.abspath(self.pwd()):
+                self.data.copy_to(self.pwd()) # e.g. registered from another cluster.
+            else:
+                self.data.flush()
+            return
+        # write aside and replace, the old file may still be memory-mapped by a loaded array.
+        tmp_path = self.pwd() + '.tmp'
+        with open(tmp_path,'wb') as f:
+            np.save(f,self.data)
+        self._replace(tmp_path,self.pwd())
 
     def save_path(self):
+        if self.is_chunked():
+            return '{}.chunks'.format(self.save_name())
         return '{}.npy'.format(self.save_name())
 
     @classmethod
-    def load(cls, save_name, cluster_pwd):
+    def snapshot(cls,data):
+        if isinstance(data,ChunkedArray):
+            return data # already on the disk.
+        return np.array(data,copy=True)
+
+    @classmethod
+    def check_mmap_mode(cls,mmap_mode):
+        if mmap_mode not in [None,'r','c']:
+            lg.error('ESL only supports read-only memory map mode "r" or copy-on-write mode "c", got {}'.format(mmap_mode))
+            raise ValueError
+        return mmap_mode
+
+    @classmethod
+    def load(cls, save_name, cluster_pwd, mmap_mode=None, **kwargs):
         data_type, data_name = cls.decode_save_name(save_name=save_name)
         assert data_type == cls.type_id()
         wrp = NumpyWrapper(data=None, data_name=data_name, cluster_pwd=cluster_pwd)
+        chunk_path = os.path.join(cluster_pwd,'{}.chunks'.format(save_name))
+        if os.path.isdir(chunk_path):
+            try:
+                wrp.data = ChunkedArray(chunk_path)
+            except IOError:
+                return None
+            return wrp
         if not os.path.exists(wrp.pwd()):
             lg.warning('No data found by data type {}, data name {}'.format(data_type, data_name))
             return None
         try:
-            wrp.data = np.load(wrp.pwd())
+            wrp.data = np.load(wrp.pwd(),mmap_mode=cls.check_mmap_mode(mmap_mode))
         except IOError:
             lg.warning('data destroyed by data type {}, data name {}'.format(data_type, data_name))
             return None
         return wrp
 
+    def to_bytes(self):
+        buf = io.BytesIO()
+        np.save(buf,self.data)
+        return buf.getvalue()
+
+    def dump_bytes(self,payload):
+        self._write_payload(payload) # the .npy format, memory-mappable as the file of dump.
+        return True
+
+    @classmethod
+    def from_bytes(cls,data_name,cluster_pwd,payload,mmap_mode=None,**kwargs):
+        '''
+            with mmap_mode, the array is a zero-copy read-only view on the payload buffer (e.g. a memory-mapped pack file).
+        '''
+        wrp = NumpyWrapper(data=None,data_name=data_name,cluster_pwd=cluster_pwd)
+        fp = io.BytesIO(payload[:min(len(payload),1 << 16)])
+        version = np.lib.format.read_magic(fp)
+        _read_header_ = np.lib.format.read_array_header_1_0 if version == (1,0) else np.lib.format.read_array_header_2_0
+        shape,fortran_order,dtype = _read_header_(fp)
+        if cls.check_mmap_mode(mmap_mode) is None or dtype.hasobject:
+            wrp.data = np.load(io.BytesIO(payload),allow_pickle=dtype.hasobject)
+            return wrp
+        count = 1
+        for dim in shape:
+            count *= dim
+        data = np.frombuffer(payload,dtype=dtype,count=count,offset=fp.tell())
+        wrp.data = data.reshape(shape,order='F' if fortran_order else 'C')
+        if mmap_mode == 'c':
+            wrp.data = wrp.data.copy()
+        return wrp
+
+    @classmethod
+    def is_support_joint(cls):
+        return True
+
+    def to_inline(self,max_bytes):
+        if self.is_chunked():
+            return None
+        return self.encode_array(self.data,max_bytes)
+
+    @classmethod
+    def from_inline(cls,data_name,cluster_pwd,value,**kwargs):
+        return NumpyWrapper(data=cls.decode_array(value),data_name=data_name,cluster_pwd=cluster_pwd)
+
+    @classmethod
+    def is_support_inline(cls):
+        return True
+
+    @classmethod
+    def encode_array(cls,data,max_bytes):
+        if data.dtype.hasobject or data.nbytes > max_bytes:
+            return None
+        return {'dtype':data.dtype.str,'shape':list(data.shape),'b64':base64.b64encode(np.ascontiguousarray(data).tobytes()).decode()}
+
+    @classmethod
+    def decode_array(cls,value):
+        return np.frombuffer(base64.b64decode(value['b64']),dtype=np.dtype(value['dtype'])).reshape(value['shape']).copy()
+
     @classmethod
     def type_id(cls):
         return 'np'
 
 
 class PandasWrapper(Wrapper):
-    def __init__(self, **kwargs):
+    '''
+        store data frames in a binary columnar format keeping index, dtypes and categoricals:
+        parquet if pyarrow is installed, otherwise a npz file with one array per column.
+        csv files of the former versions are still loadable.
+    '''
+    def __init__(self, fmt=None, **kwargs):
         super(PandasWrapper, self).__init__(**kwargs)
+        self.fmt = fmt
 
     def dump(self):
-        self.data.to_csv(self.pwd(),index=False)
+        self.fmt = 'parquet' if self.is_support_parquet(self.data) else 'npz'
+        # write aside and replace, a crash never leaves a torn file.
+        if self.fmt == 'parquet':
+            try:
+                self.data.to_parquet(self.pwd() + '.tmp',engine='pyarrow')
+            except (ValueError,TypeError,NotImplementedError) as e:
+                # e.g. mixed-type object columns that arrow can not convert.
+                lg.info('ESL fall back to npz for data frame {}: {}'.format(self.data_name,e))
+                if os.path.exists(self.pwd() + '.tmp'):
+                    os.remove(self.pwd() + '.tmp')
+                self.fmt = 'npz'
+        if self.fmt == 'npz':
+            with open(self.pwd() + '.tmp','wb') as f:
+                self._dump_npz(f)
+        self._replace(self.pwd() + '.tmp',self.pwd())
+        self._remove_stale()
+
+    def dump_bytes(self,payload):
+        self.fmt = 'parquet' if bytes(payload[:4]) == b'PAR1' else 'npz'
+        self._write_payload(payload)
+        self._remove_stale()
+        return True
+
+    def _remove_stale(self):
+        for fmt in self.__class__.formats():
+            stale_path = os.path.join(self.cluster_pwd,'{}.{}'.format(self.save_name(),fmt))
+            if fmt != self.fmt and os.path.exists(stale_path):
+                os.remove(stale_path)
 
     def save_path(self):
-        return '{}.csv'.format(self.save_name())
+        if self.fmt is None:
+            self.fmt = 'parquet' if self.is_support_parquet(self.data) else 'npz'
+        return '{}.{}'.format(self.save_name(),self.fmt)
+
+    @classmethod
+    def snapshot(cls,data):
+        return data.copy(deep=True)
+
+    @classmethod
+    def formats(cls):
+        return ['parquet','npz','csv']
+
+    @classmethod
+    def is_support_parquet(cls,data):
+        if not util.is_module_available('pyarrow'):
+            return False
+        if data is None:
+            return True
+        return all(type(label) is str for label in data.columns) and data.columns.is_unique
+
+    def to_bytes(self):
+        buf = io.BytesIO()
+        if self.is_support_parquet(self.data):
+            try:
+                self.data.to_parquet(buf,engine='pyarrow')
+                return buf.getvalue()
+            except (ValueError,TypeError,NotImplementedError):
+                buf = io.BytesIO()
+        self._dump_npz(buf)
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls,data_name,cluster_pwd,payload,columns=None,**kwargs):
+        wrp = PandasWrapper(data=None,data_name=data_name,cluster_pwd=cluster_pwd)
+        if bytes(payload[:4]) == b'PAR1':
+            wrp.fmt = 'parquet'
+            wrp.data = pd.read_parquet(io.BytesIO(payload),columns=columns,engine='pyarrow')
+        else:
+            wrp.fmt = 'npz'
+            wrp.data = cls._load_npz(io.BytesIO(payload),columns=columns)
+        return wrp
+
+    @classmethod
+    def is_support_joint(cls):
+        return True
+
+    def _dump_npz(self,f):
+        df = self.data
+        arrays = {}
+        col_meta = [self._encode_series('c{}'.format(i),df.iloc[:,i],arrays) for i in range(df.shape[1])]
+        idx_meta = [self._encode_series('i{}'.format(i),df.index.get_level_values(i),arrays) for i in range(df.index.nlevels)]
+        labels = np.empty(2,dtype=object)
+        labels[0],labels[1] = list(df.columns),list(df.index.names)
+        arrays['__labels__'] = labels
+        arrays['__meta__'] = np.array(json.dumps({'columns':col_meta,'index':idx_meta}))
+        np.savez(f,**arrays)
+
+    @classmethod
+    def _encode_series(cls,key,values,arrays):
+        dtype = values.dtype
+        if isinstance(dtype,pd.CategoricalDtype):
+            arrays[key] = np.asarray(values.codes if hasattr(values,'codes') else values.cat.codes)
+            cls._encode_series(key + '.cat',dtype.categories,arrays)
+            return {'kind':'cat','ordered':bool(dtype.ordered),'dtype':str(dtype.categories.dtype)}
+        elif isinstance(dtype,np.dtype) and dtype.kind != 'O':
+            arrays[key] = np.asarray(values)
+            return {'kind':'np'}
+        else:
+            # object and pandas extension dtypes, restored by the dtype name.
+            arrays[key] = np.asarray(values.to_numpy(dtype=object),dtype=object)
+            return {'kind':'ext','dtype':str(dtype)}
+
+    @classmethod
+    def _decode_series(cls,key,meta,npz):
+        if meta['kind'] == 'cat':
+            categories = pd.Index(npz[key + '.cat']).astype(meta['dtype'])
+            return pd.Categorical.from_codes(npz[key],categories=categories,ordered=meta['ordered'])
+        elif meta['kind'] == 'np':
+            return npz[key]
+        else:
+            return pd.array(npz[key],dtype=None if meta['dtype'] == 'object' else meta['dtype'])
 
     @classmethod
-    def load(cls, save_name, cluster_pwd):
+    def _load_npz(cls,path,columns=None):
+        with np.load(path,allow_pickle=True) as npz:
+            meta = json.loads(str(npz['__meta__']))
+            col_labels,idx_names = npz['__labels__']
+            positions = range(len(col_labels)) if columns is None else [col_labels.index(col) for col in columns]
+            index_values = [cls._decode_series('i{}'.format(i),meta['index'][i],npz) for i in range(len(idx_names))]
+            if len(index_values) == 1:
+                index = pd.Index(index_values[0],name=idx_names[0])
+            else:
+                index = pd.MultiIndex.from_arrays(index_values,names=idx_names)
+            data = {}
+            for new_pos,pos in enumerate(positions):
+                data[new_pos] = pd.Series(cls._decode_series('c{}'.format(pos),meta['columns'][pos],npz),index=index,copy=False)
+            df = pd.DataFrame(data,index=index)
+            df.columns = [col_labels[pos] for pos in positions]
+            return df
+
+    @classmethod
+    def parts_path(cls,cluster_pwd,save_name):
+        return os.path.join(cluster_pwd,'{}.parts'.format(save_name))
+
+    def dump_part(self,idx):
+        '''
+            write the data frame as the idx-th part of an appended data frame.
+        '''
+        parts_path = self.parts_path(self.cluster_pwd,self.save_name())
+        os.makedirs(parts_path,exist_ok=True)
+        part_path = os.path.join(parts_path,'{:08d}.part'.format(idx))
+        with open(part_path + '.tmp','wb') as f:
+            f.write(self.to_bytes())
+        self._replace(part_path + '.tmp',part_path)
+
+    @classmethod
+    def iter_parts(cls,cluster_pwd,save_name,columns=None):
+        parts_path = cls.parts_path(cluster_pwd,save_name)
+        for part_name in sorted(os.listdir(parts_path)):
+            if not part_name.endswith('.part'):
+                continue
+            with open(os.path.join(parts_path,part_name),'rb') as f:
+                payload = f.read()
+            yield cls.from_bytes(data_name=None,cluster_pwd=cluster_pwd,payload=payload,columns=columns).data
+
+    @classmethod
+    def load(cls, save_name, cluster_pwd, columns=None, **kwargs):
+        '''
+        :param columns: load only the specified columns if not None.
+        '''
         data_type, data_name = cls.decode_save_name(save_name=save_name)
         assert data_type == cls.type_id()
-        wrp = PandasWrapper(data=None, data_name=data_name, cluster_pwd=cluster_pwd)
+        if os.path.isdir(cls.parts_path(cluster_pwd,save_name)):
+            try:
+                parts = list(cls.iter_parts(cluster_pwd,save_name,columns=columns))
+            except (IOError,ValueError,KeyError):
+                lg.warning('data destroyed by data type {}, data name {}'.format(data_type, data_name))
+                return None
+            return PandasWrapper(data=pd.concat(parts) if len(parts) > 0 else pd.DataFrame(),data_name=data_name,cluster_pwd=cluster_pwd)
+        wrp = None
+        for fmt in cls.formats():
+            wrp = PandasWrapper(data=None, data_name=data_name, cluster_pwd=cluster_pwd,fmt=fmt)
+            if os.path.exists(wrp.pwd()):
+                break
         if not os.path.exists(wrp.pwd()):
             lg.warning('No data found by data type {}, data name {}'.format(data_type, data_name))
             return None
         try:
-            wrp.data = pd.read_csv(wrp.pwd())
-        except IOError:
+            if wrp.fmt == 'parquet':
+                wrp.data = pd.read_parquet(wrp.pwd(),columns=columns,engine='pyarrow')
+            elif wrp.fmt == 'npz':
+                wrp.data = cls._load_npz(wrp.pwd(),columns=columns)
+            else:
+                wrp.data = pd.read_csv(wrp.pwd(),usecols=columns)
+        except (IOError,ValueError,KeyError):
             lg.warning('data destroyed by data type {}, data name {}'.format(data_type, data_name))
             return None
         return wrp
@@ -144,6 +772,13 @@ class PandasWrapper(Wrapper):
 
 
 class DGLWrapper(Wrapper):
+    '''
+        the graphs of a cluster are stored together in a single save_graphs container, with the index of each graph
+        kept in its meta, so that they are loaded in one pass or selectively. a graph can still be dumped alone,
+        as the former versions did.
+    '''
+    __CONTAINER__ = 'dgl.graphs'
+
     def __init__(self, **kwargs):
         super(DGLWrapper, self).__init__(**kwargs)
 
@@ -154,10 +789,41 @@ class DGLWrapper(Wrapper):
         return '{}.dgl.graph'.format(self.save_name())
 
     @classmethod
-    def load(cls, save_name, cluster_pwd):
+    def container_path(cls,cluster_pwd):
+        return os.path.join(cluster_pwd,cls.__CONTAINER__)
+
+    @classmethod
+    def dump_container(cls,cluster_pwd,graphs,sync=False):
+        # written aside and replaced, readers never see a partial container.
+        tmp_path = cls.container_path(cluster_pwd) + '.tmp'
+        dgl.save_graphs(tmp_path,graphs)
+        if sync:
+            util.fsync_path(tmp_path)
+        os.replace(tmp_path,cls.container_path(cluster_pwd))
+
+    @classmethod
+    def load_container(cls,cluster_pwd,save_names,idx_list):
+        '''
+            read the graphs of the save names at idx_list of the container by one load_graphs call.
+        '''
+        gs,_ = dgl.load_graphs(cls.container_path(cluster_pwd),[int(idx) for idx in idx_list])
+        return [DGLWrapper(data=g,data_name=cls.decode_save_name(save_name=save_name)[1],cluster_pwd=cluster_pwd)
+                for save_name,g in zip(save_names,gs)]
+
+    @classmethod
+    def load(cls, save_name, cluster_pwd, idx=None, **kwargs):
+        '''
+        :param idx: index of the graph in the container, None for a graph dumped alone.
+        '''
         data_type, data_name = cls.decode_save_name(save_name=save_name)
         assert data_type == cls.type_id()
         wrp = DGLWrapper(data=None, data_name=data_name, cluster_pwd=cluster_pwd)
+        if idx is not None:
+            try:
+                return cls.load_container(cluster_pwd,[save_name],[idx])[0]
+            except (IOError,dgl.DGLError):
+                lg.warning('data destroyed by data type {}, data name {}'.format(data_type, data_name))
+                return None
         if not os.path.exists(wrp.pwd()):
             lg.warning('No data found by data type {}, data name {}'.format(data_type, data_name))
             return None
@@ -176,60 +842,505 @@ class DGLWrapper(Wrapper):
 
 
 class TorchWrapper(Wrapper):
-    def __init__(self, **kwargs):
+    '''
+        store a tensor, or a state_dict-style dict of tensors, in a safetensors-compatible file: a little-endian u64
+        header size, a json header of dtype, shape and data offsets per tensor, and then the raw contiguous data.
+        tensors are loaded without unpickling, as zero-copy views on a memory map with mmap_mode, and selected keys
+        are read without touching the rest. tensors of other dtypes fall back to tc.save, as the former versions did.
+    '''
+    __DTYPES__ = {'F64':'float64','F32':'float32','F16':'float16','BF16':'bfloat16','I64':'int64','I32':'int32',
+                  'I16':'int16','I8':'int8','U8':'uint8','BOOL':'bool','C64':'complex64'}
+    __TENSOR__ = 'tensor' # key of a single tensor.
+
+    def __init__(self, fmt=None, **kwargs):
         super(TorchWrapper, self).__init__(**kwargs)
+        self.fmt = fmt
 
     def dump(self):
-        tc.save(self.data,self.pwd())
+        try:
+            header,tensors = self.encode(self.data)
+            self.fmt = 'safetensors'
+        except TypeError:
+            header,tensors = None,None
+            self.fmt = 'tensor'
+        tmp_path = self.pwd() + '.tmp'
+        with open(tmp_path,'wb') as f:
+            if header is None:
+                tc.save(self.data,f)
+            else:
+                self._write(f,header,tensors)
+        self._replace(tmp_path,self.pwd()) # the old file may still be memory-mapped by loaded tensors.
+        self._remove_stale()
+
+    def dump_bytes(self,payload):
+        self.fmt = 'tensor' if self.read_header(payload) is None else 'safetensors'
+        self._write_payload(payload)
+        self._remove_stale()
+        return True
+
+    def _remove_stale(self):
+        stale_path = os.path.join(self.cluster_pwd,'{}.{}'.format(self.save_name(),'tensor' if self.fmt == 'safetensors' else 'safetensors'))
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
 
     def save_path(self):
-        return '{}.tensor'.format(self.save_name())
+        return '{}.{}'.format(self.save_name(),self.fmt or 'safetensors')
+
+    @classmethod
+    def is_tensor_dict(cls,data):
+        return type(data) in [dict,OrderedDict] and len(data) > 0 and \
+               all(type(key) is str and util.check_type(value,'torch','Tensor') for key,value in data.items())
 
     @classmethod
-    def load(cls, save_name, cluster_pwd):
+    def snapshot(cls,data):
+        if cls.is_tensor_dict(data):
+            return type(data)((key,value.detach().clone()) for key,value in data.items())
+        return data.detach().clone()
+
+    @classmethod
+    def encode(cls,data):
+        '''
+            (header, [contiguous cpu tensors in data order]) of a tensor or a dict of tensors,
+            raise TypeError for dtypes out of the format.
+        '''
+        dtype2name = {getattr(tc,dtype):name for name,dtype in cls.__DTYPES__.items()}
+        items = list(data.items()) if cls.is_tensor_dict(data) else [(cls.__TENSOR__,data)]
+        # larger items first, so that every tensor is aligned to its item size.
+        items.sort(key=lambda item:-item[1].element_size())
+        header,tensors,offset = {},[],0
+        for key,tensor in items:
+            if tensor.dtype not in dtype2name:
+                raise TypeError('unsupported tensor dtype {}'.format(tensor.dtype))
+            tensor = tensor.detach().cpu().contiguous()
+            n_bytes = tensor.element_size() * tensor.nelement()
+            header[key] = {'dtype':dtype2name[tensor.dtype],'shape':list(tensor.shape),'data_offsets':[offset,offset + n_bytes]}
+            tensors.append(tensor)
+            offset += n_bytes
+        kind = 'tensor' if not cls.is_tensor_dict(data) else type(data).__name__
+        keys = [] if kind == 'tensor' else list(data.keys())
+        header['__metadata__'] = {'format':'pt','esl_kind':kind,'esl_keys':json.dumps(keys)}
+        return header,tensors
+
+    @classmethod
+    def _write(cls,f,header,tensors):
+        buf = json.dumps(header).encode()
+        buf += b' ' * (-len(buf) % 8) # the data starts 8-byte aligned.
+        f.write(len(buf).to_bytes(8,'little'))
+        f.write(buf)
+        for tensor in tensors:
+            if tensor.nelement() > 0:
+                f.write(tensor.reshape(-1).view(tc.uint8).numpy().data)
+
+    @classmethod
+    def read_header(cls,buf):
+        '''
+            (header, data start) from the leading bytes of a file or a payload, None if not in this format.
+        '''
+        if len(buf) < 9 or bytes(buf[8:9]) != b'{':
+            return None
+        header_size = int.from_bytes(bytes(buf[:8]),'little')
+        if len(buf) < 8 + header_size:
+            return header_size
+        return json.loads(bytes(buf[8:8 + header_size]).decode()),8 + header_size
+
+    @classmethod
+    def decode(cls,header,read,keys=None):
+        '''
+            restore the data of a header, where read(start, end) returns a buffer of the data bytes for torch.frombuffer.
+        :param keys: read only these tensors of a dict.
+        '''
+        meta = header['__metadata__']
+        names = [cls.__TENSOR__] if meta['esl_kind'] == 'tensor' else json.loads(meta['esl_keys'])
+        if keys is not None and meta['esl_kind'] != 'tensor':
+            names = [name for name in names if name in keys]
+        tensors = []
+        for name in names:
+            info = header[name]
+            dtype = getattr(tc,cls.__DTYPES__[info['dtype']])
+            st,ed = info['data_offsets']
+            if ed == st:
+                tensors.append(tc.empty(info['shape'],dtype=dtype))
+            else:
+                tensors.append(tc.frombuffer(read(st,ed),dtype=dtype).reshape(info['shape']))
+        if meta['esl_kind'] == 'tensor':
+            return tensors[0]
+        return (OrderedDict if meta['esl_kind'] == 'OrderedDict' else dict)(zip(names,tensors))
+
+    @classmethod
+    def load(cls, save_name, cluster_pwd, mmap_mode=None, keys=None, **kwargs):
+        '''
+        :param mmap_mode: 'r' or 'c' to load tensors as zero-copy views on a private memory map of the file,
+            pages are shared with other processes until written.
+        :param keys: load only these tensors of a dict.
+        '''
         data_type, data_name = cls.decode_save_name(save_name=save_name)
         assert data_type == cls.type_id()
-        wrp = TorchWrapper(data=None, data_name=data_name, cluster_pwd=cluster_pwd)
+        wrp = None
+        for fmt in ['safetensors','tensor']:
+            wrp = TorchWrapper(data=None, data_name=data_name, cluster_pwd=cluster_pwd, fmt=fmt)
+            if os.path.exists(wrp.pwd()):
+                break
         if not os.path.exists(wrp.pwd()):
             lg.warning('No data found by data type {}, data name {}'.format(data_type, data_name))
             return None
         try:
-            wrp.data = tc.load(wrp.pwd(),map_location='cpu')
-        except IOError:
+            if wrp.fmt == 'tensor':
+                wrp.data = tc.load(wrp.pwd(),map_location='cpu')
+                return wrp
+            with open(wrp.pwd(),'rb') as f:
+                head = f.read(1 << 16)
+                ret = cls.read_header(head)
+                if type(ret) is int:
+                    f.seek(0)
+                    ret = cls.read_header(f.read(8 + ret))
+                header,data_st = ret
+                if NumpyWrapper.check_mmap_mode(mmap_mode) is not None:
+                    # a private map: written pages are copied, never the file or its other readers.
+                    buf = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_COPY)
+                    read = lambda st,ed:memoryview(buf)[data_st + st:data_st + ed]
+                else:
+                    def read(st,ed):
+                        f.seek(data_st + st)
+                        data = bytearray(ed - st)
+                        f.readinto(data)
+                        return data
+                wrp.data = cls.decode(header,read,keys=keys)
+        except (IOError,ValueError,KeyError,TypeError,RuntimeError):
             lg.warning('data destroyed by data type {}, data name {}'.format(data_type, data_name))
             return None
         return wrp
 
+    def to_bytes(self):
+        buf = io.BytesIO()
+        try:
+            header,tensors = self.encode(self.data)
+        except TypeError:
+            tc.save(self.data,buf)
+            return buf.getvalue()
+        self._write(buf,header,tensors)
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls,data_name,cluster_pwd,payload,keys=None,**kwargs):
+        ret = cls.read_header(payload)
+        if ret is None: # tc.save payloads.
+            return TorchWrapper(data=tc.load(io.BytesIO(payload),map_location='cpu'),data_name=data_name,cluster_pwd=cluster_pwd)
+        header,data_st = ret
+        # copied, a payload view on the pack file is read-only.
+        data = cls.decode(header,lambda st,ed:bytearray(payload[data_st + st:data_st + ed]),keys=keys)
+        return TorchWrapper(data=data,data_name=data_name,cluster_pwd=cluster_pwd)
+
+    @classmethod
+    def is_support_joint(cls):
+        return True
+
+    def to_inline(self,max_bytes):
+        if self.is_tensor_dict(self.data):
+            return None
+        if self.data.element_size() * self.data.nelement() > max_bytes or self.data.requires_grad:
+            return None
+        try:
+            array = self.data.detach().cpu().numpy()
+        except TypeError: # e.g. bfloat16 has no numpy dtype.
+            return None
+        return NumpyWrapper.encode_array(array,max_bytes)
+
+    @classmethod
+    def from_inline(cls,data_name,cluster_pwd,value,**kwargs):
+        return TorchWrapper(data=tc.from_numpy(NumpyWrapper.decode_array(value)),data_name=data_name,cluster_pwd=cluster_pwd)
+
+    @classmethod
+    def is_support_inline(cls):
+        return True
+
     @classmethod
     def type_id(cls):
         return 'tc'
 
 
 class NetworkXWrapper(Wrapper):
+    '''
+        store Graph, DiGraph, MultiGraph and MultiDiGraph in a directory of .npy arrays:
+        node ids, CSR edge arrays (indptr & indices of node positions, plus keys of multi-graphs), and one column
+        (with a presence mask if partial) per node / edge attribute. graph attributes and graphs with non-string
+        attribute names are pickled. files of the former versions (gpickle) are still loadable.
+        load options: view='graph' (default), 'csr' for the raw arrays, 'scipy' for a sparse adjacency matrix,
+        and mmap_mode to memory-map the arrays of the raw views.
+    '''
+    __META__ = 'meta.json'
+
     def __init__(self, **kwargs):
         super(NetworkXWrapper, self).__init__(**kwargs)
 
     def dump(self):
-        nx.write_gpickle(self.data, self.pwd())
+        try:
+            meta,arrays = self.to_arrays(self.data)
+        except TypeError:
+            meta,arrays = {'pickle':True},{}
+        self._dump_arrays(meta,arrays)
+
+    def dump_bytes(self,payload):
+        if bytes(payload[:2]) != b'PK': # pickled graph with non-string attribute names.
+            self._dump_arrays({'pickle':True},{},payload)
+            return True
+        with np.load(io.BytesIO(payload),allow_pickle=True) as npz:
+            arrays = {key:npz[key] for key in npz.files}
+        meta = json.loads(str(arrays.pop('__meta__')))
+        self._dump_arrays(meta,arrays)
+        return True
+
+    def _dump_arrays(self,meta,arrays,pickled=None):
+        # written aside and swapped, the old arrays may still be memory-mapped.
+        tmp_path,old_path = self.pwd() + '.tmp',self.pwd() + '.old'
+        for path in [tmp_path,old_path]:
+            if os.path.exists(path):
+                shutil.rmtree(path)
+        os.makedirs(tmp_path)
+        if meta.get('pickle'):
+            with open(os.path.join(tmp_path,'graph.pkl'),'wb') as f:
+                if pickled is None:
+                    pickle.dump(self.data,f,protocol=pickle.HIGHEST_PROTOCOL)
+                else:
+                    f.write(pickled)
+        for key,value in arrays.items():
+            np.save(os.path.join(tmp_path,'{}.npy'.format(key)),value)
+        with open(os.path.join(tmp_path,self.__class__.__META__),'w') as f:
+            json.dump(meta,f)
+        if self.sync:
+            util.fsync_path(tmp_path)
+        if os.path.exists(self.pwd()):
+            os.rename(self.pwd(),old_path)
+        os.rename(tmp_path,self.pwd())
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
 
     def save_path(self):
-        return '{}.networkx.graph'.format(self.save_name())
+        return '{}.nxgraph'.format(self.save_name())
+
+    @classmethod
+    def legacy_path(cls,cluster_pwd,save_name):
+        return os.path.join(cluster_pwd,'{}.networkx.graph'.format(save_name))
+
+    @classmethod
+    def to_arrays(cls,g):
+        '''
+            (meta, arrays) of a graph, raise TypeError if an attribute name is not a string.
+        '''
+        is_multi,is_directed = g.is_multigraph(),g.is_directed()
+        nodes = list(g.nodes())
+        node_array = cls._encode_values(nodes)
+        # the adjacency is walked in node order, so the edges come sorted by source as CSR needs.
+        # the walks run in map / chain rather than python loops per edge.
+        nbr_dicts = [nbrs for _,nbrs in g.adjacency()]
+        degrees = np.fromiter(map(len,nbr_dicts),dtype=np.int64,count=len(nbr_dicts))
+        src = np.repeat(np.arange(len(nodes),dtype=np.int64),degrees)
+        if node_array.dtype != object: # typed node ids are located by array lookups instead of dict lookups.
+            nbr_array = np.array(list(itertools.chain.from_iterable(nbr_dicts)),dtype=node_array.dtype)
+            id_min,id_max = (int(node_array.min()),int(node_array.max())) if node_array.dtype == np.int64 and len(nodes) > 0 else (0,None)
+            if id_max is not None and id_max - id_min < 4 * len(nodes): # dense integer ids, e.g. 0..n-1.
+                lut = np.empty(id_max - id_min + 1,dtype=np.int64)
+                lut[node_array - id_min] = np.arange(len(nodes),dtype=np.int64)
+                dst = lut[nbr_array - id_min]
+            else:
+                sorter = np.argsort(node_array,kind='stable')
+                dst = sorter[np.searchsorted(node_array[sorter],nbr_array)].astype(np.int64)
+        else:
+            node_pos = dict(zip(nodes,range(len(nodes))))
+            dst = np.fromiter(map(node_pos.__getitem__,itertools.chain.from_iterable(nbr_dicts)),dtype=np.int64,count=len(src))
+        edge_dicts = list(itertools.chain.from_iterable(map(operator.methodcaller('values'),nbr_dicts)))
+        if not is_directed:
+            kept = dst >= src # stored once from the former end.
+            src,dst = src[kept],dst[kept]
+            edge_dicts = list(itertools.compress(edge_dicts,kept.tolist()))
+        keys = None
+        if is_multi: # edge_dicts holds the key -> attributes dict of each neighbor.
+            n_keys = np.fromiter(map(len,edge_dicts),dtype=np.int64,count=len(edge_dicts))
+            src,dst = np.repeat(src,n_keys),np.repeat(dst,n_keys)
+            keys = list(itertools.chain.from_iterable(edge_dicts))
+            edge_dicts = list(itertools.chain.from_iterable(map(operator.methodcaller('values'),edge_dicts)))
+        arrays = {'nodes':node_array,
+                  'indptr':np.concatenate([[0],np.cumsum(np.bincount(src,minlength=len(nodes)),dtype=np.int64)]).astype(np.int64),
+                  'indices':dst,
+                  'graph':np.frombuffer(pickle.dumps(g.graph,protocol=pickle.HIGHEST_PROTOCOL),dtype=np.uint8)}
+        if is_multi:
+            arrays['keys'] = cls._encode_values(keys)
+        node_attrs = cls._encode_attrs([attrs for _,attrs in g.nodes(data=True)],'n',arrays)
+        edge_attrs = cls._encode_attrs(edge_dicts,'e',arrays)
+        meta = {'directed':is_directed,'multigraph':is_multi,'node_attrs':node_attrs,'edge_attrs':edge_attrs}
+        return meta,arrays
+
+    @classmethod
+    def _encode_values(cls,values):
+        value_types = set(map(type,values))
+        for value_type,dtype in [(int,np.int64),(float,np.float64),(bool,np.bool_),(str,np.str_)]:
+            if value_types == {value_type}:
+                try:
+                    return np.array(values,dtype=dtype)
+                except OverflowError:
+                    break
+        array = np.empty(len(values),dtype=object)
+        array[:] = values
+        return array
+
+    @classmethod
+    def _encode_attrs(cls,attr_dicts,prefix,arrays):
+        # names are taken from the first dict, the full scan for the others is only needed if the counts of names differ.
+        names = list(attr_dicts[0]) if len(attr_dicts) > 0 else []
+        n_total,n_found,idx = sum(map(len,attr_dicts)),0,0
+        while idx < len(names) or n_found < n_total:
+            if idx == len(names): # names absent from the first dict, in the order of first appearance.
+                found = set(names)
+                names += [name for name in dict.fromkeys(itertools.chain.from_iterable(attr_dicts)) if name not in found]
+            name = names[idx]
+            if type(name) is not str:
+                raise TypeError('attribute name {!r} is not a string'.format(name))
+            try:
+                values,mask = list(map(operator.itemgetter(name),attr_dicts)),None
+            except KeyError: # partial attribute.
+                mask = np.fromiter(map(operator.contains,attr_dicts,itertools.repeat(name)),dtype=bool,count=len(attr_dicts))
+                values = list(map(operator.itemgetter(name),itertools.compress(attr_dicts,mask.tolist())))
+            column = cls._encode_values(values)
+            if mask is not None:
+                full = np.zeros(len(attr_dicts),dtype=column.dtype) if column.dtype != object else np.empty(len(attr_dicts),dtype=object)
+                full[mask] = column
+                column = full
+                arrays['{}mask-{}'.format(prefix,idx)] = mask
+            arrays['{}attr-{}'.format(prefix,idx)] = column
+            n_found += len(values)
+            idx += 1
+        return names
 
     @classmethod
-    def load(cls, save_name, cluster_pwd):
+    def from_arrays(cls,meta,arrays,view='graph',weight='weight'):
+        '''
+            restore a graph, a dict of the raw CSR arrays (view='csr') or a scipy sparse adjacency matrix (view='scipy')
+            from to_arrays, where arrays maps a key to its array (or memory map).
+        '''
+        node_attrs = {name:(arrays['nattr-{}'.format(idx)],arrays.get('nmask-{}'.format(idx)))
+                      for idx,name in enumerate(meta['node_attrs'])}
+        edge_attrs = {name:(arrays['eattr-{}'.format(idx)],arrays.get('emask-{}'.format(idx)))
+                      for idx,name in enumerate(meta['edge_attrs'])}
+        nodes,indptr,indices = arrays['nodes'],arrays['indptr'],arrays['indices']
+        if view == 'csr':
+            return {'directed':meta['directed'],'multigraph':meta['multigraph'],'nodes':nodes,'indptr':indptr,
+                    'indices':indices,'keys':arrays.get('keys'),'node_attrs':node_attrs,'edge_attrs':edge_attrs}
+        elif view == 'scipy':
+            if not util.is_module_available('scipy'):
+                lg.error('ESL needs scipy to load graphs as sparse matrices, plz install it.')
+                raise ImportError
+            sp = util.lazy_import('scipy.sparse')
+            data = np.ones(len(indices)) if weight not in edge_attrs else np.asarray(edge_attrs[weight][0],dtype=np.float64)
+            adj = sp.csr_array((data,indices,indptr),shape=(len(nodes),len(nodes)))
+            if not meta['directed']:
+                adj = adj + adj.T - sp.diags_array(adj.diagonal()) # each undirected edge is stored once.
+            adj.sum_duplicates() # parallel edges of multi-graphs.
+            return adj
+        elif view != 'graph':
+            lg.error('ESL encounter unknown graph view {}, use "graph", "csr" or "scipy".'.format(view))
+            raise ValueError
+        _graph_cls_ = {(False,False):nx.Graph,(True,False):nx.DiGraph,(False,True):nx.MultiGraph,
+                       (True,True):nx.MultiDiGraph}[(meta['directed'],meta['multigraph'])]
+        g = _graph_cls_()
+        g.graph.update(pickle.loads(np.asarray(arrays['graph']).tobytes()))
+        node_list = nodes.tolist()
+        g.add_nodes_from(zip(node_list,cls._decode_attrs(node_attrs,len(node_list))) if len(node_attrs) > 0 else node_list)
+        src = np.repeat(np.arange(len(node_list)),np.diff(indptr))
+        columns = [nodes[src].tolist(),nodes[indices].tolist()]
+        if meta['multigraph']:
+            columns.append(arrays['keys'].tolist())
+        columns.append(cls._decode_attrs(edge_attrs,len(indices)))
+        if meta['multigraph']:
+            g.add_edges_from(zip(*columns))
+            return g
+        # simple graphs fill the adjacency dicts directly, add_edges_from costs several times more per edge.
+        # these dicts are internal to networkx, so the filled graph is checked by its public degree views
+        # and rebuilt by add_edges_from if a networkx version keeps its adjacency otherwise.
+        succ,pred = (getattr(g,'_succ',None),getattr(g,'_pred',None)) if meta['directed'] else (getattr(g,'_adj',None),) * 2
+        if type(succ) is dict and type(pred) is dict:
+            for u,v,attrs in zip(*columns):
+                succ[u][v] = attrs
+                pred[v][u] = attrs
+            is_filled = g.number_of_edges() == len(indices) and \
+                        (not meta['directed'] or sum(degree for _,degree in g.in_degree()) == len(indices))
+            if is_filled:
+                return g
+            lg.warning('ESL can not fill the adjacency of networkx {} directly, use add_edges_from.'.format(nx.__version__))
+            g.clear_edges()
+        g.add_edges_from(zip(*columns))
+        return g
+
+    @classmethod
+    def _decode_attrs(cls,attrs,size):
+        attr_dicts = [{} for _ in range(size)]
+        for name,(column,mask) in attrs.items():
+            values = column.tolist()
+            positions = range(size) if mask is None else np.nonzero(mask)[0].tolist()
+            for pos in positions:
+                attr_dicts[pos][name] = values[pos]
+        return attr_dicts
+
+    @classmethod
+    def load(cls, save_name, cluster_pwd, view='graph', mmap_mode=None, weight='weight', **kwargs):
+        '''
+        :param view: 'graph', 'csr' or 'scipy', see the class doc.
+        :param mmap_mode: memory-map the non-object arrays, useful with the raw views.
+        '''
         data_type, data_name = cls.decode_save_name(save_name=save_name)
         assert data_type == cls.type_id()
+        if view not in ['graph','csr','scipy']: # checked before reading, never taken for destroyed data.
+            lg.error('ESL encounter unknown graph view {}, use "graph", "csr" or "scipy".'.format(view))
+            raise ValueError
         wrp = NetworkXWrapper(data=None, data_name=data_name, cluster_pwd=cluster_pwd)
+        if os.path.exists(cls.legacy_path(cluster_pwd,save_name)) and not os.path.exists(wrp.pwd()):
+            with open(cls.legacy_path(cluster_pwd,save_name),'rb') as f:
+                wrp.data = pickle.load(f) # gpickle of the former versions.
+            return wrp
         if not os.path.exists(wrp.pwd()):
             lg.warning('No data found by data type {}, data name {}'.format(data_type, data_name))
             return None
         try:
-            wrp.data = nx.read_gpickle(wrp.pwd())
-        except IOError:
+            with open(os.path.join(wrp.pwd(),cls.__META__),'r') as f:
+                meta = json.load(f)
+            if meta.get('pickle'):
+                with open(os.path.join(wrp.pwd(),'graph.pkl'),'rb') as f:
+                    wrp.data = pickle.load(f)
+                return wrp
+            arrays = {}
+            for file_name in os.listdir(wrp.pwd()):
+                if file_name.endswith('.npy'):
+                    path = os.path.join(wrp.pwd(),file_name)
+                    try:
+                        arrays[file_name[:-len('.npy')]] = np.load(path,mmap_mode=NumpyWrapper.check_mmap_mode(mmap_mode))
+                    except ValueError: # object arrays can not be memory-mapped.
+                        arrays[file_name[:-len('.npy')]] = np.load(path,allow_pickle=True)
+            wrp.data = cls.from_arrays(meta,arrays,view=view,weight=weight)
+        except (IOError,ValueError,KeyError):
             lg.warning('data destroyed by data type {}, data name {}'.format(data_type, data_name))
             return None
         return wrp
 
+    def to_bytes(self):
+        try:
+            meta,arrays = self.to_arrays(self.data)
+        except TypeError:
+            return pickle.dumps(self.data,protocol=pickle.HIGHEST_PROTOCOL)
+        buf = io.BytesIO()
+        np.savez(buf,__meta__=np.array(json.dumps(meta)),**arrays)
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls,data_name,cluster_pwd,payload,view='graph',weight='weight',**kwargs):
+        if bytes(payload[:2]) != b'PK': # pickled graph with non-string attribute names.
+            return NetworkXWrapper(data=pickle.loads(payload),data_name=data_name,cluster_pwd=cluster_pwd)
+        with np.load(io.BytesIO(payload),allow_pickle=True) as npz:
+            arrays = {key:npz[key] for key in npz.files}
+        meta = json.loads(str(arrays.pop('__meta__')))
+        return NetworkXWrapper(data=cls.from_arrays(meta,arrays,view=view,weight=weight),data_name=data_name,cluster_pwd=cluster_pwd)
+
+    @classmethod
+    def is_support_joint(cls):
+        return True
+
     @classmethod
     def type_id(cls):
         return 'nx'
@@ -22,11 +22,15 @@ setuptools.setup(
     install_requires=[
         'numpy',
         'pandas',
-        'dgl',
-        'networkx',
-        'torch',
     ],
-    python_requires=">=3",
+    # optional backends, imported only when data of their types is used.
+    extras_require={
+        'parquet': ['pyarrow'],
+        'torch': ['torch'],
+        'dgl': ['dgl'],
+        'networkx': ['networkx'],
+    },
+    python_requires=">=3.8", # pickle protocol 5 and multiprocessing.shared_memory.
     url="https://github.com/HoeTosaki/EasySL",
 )
 
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import threading
+import unittest
+from esl.core import ESL
+from esl.wrapper import InnerWrapper
+
+
+class AppendTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.root_dir = ESL.__ROOT_DIR__
+        ESL.config_meta_path(save_path=self.root.name)
+
+    def tearDown(self):
+        for cluster_id in [cluster_id for cluster_id in ESL.__GLB_ESL_DICT__ if cluster_id.startswith('GLB@append')]:
+            del ESL.__GLB_ESL_DICT__[cluster_id]
+        ESL.__ROOT_DIR__ = self.root_dir
+        self.root.cleanup()
+
+    def reopen(self,esl):
+        esl.close()
+        del ESL.__GLB_ESL_DICT__[esl.cluster_id]
+        return ESL.from_cluster(esl.cluster_name)
+
+    def test_append_reopen(self):
+        esl = ESL.from_cluster('append_reopen')
+        esl.register(lst=[(1,2),b'x',{3:frozenset([4])}])
+        esl.append('lst',[(5,6),{7}])
+        esl.append('lst',[b'y'])
+        esl = self.reopen(esl)
+        self.assertEqual(esl.inn().lst,[(1,2),b'x',{3:frozenset([4])},(5,6),{7},b'y'])
+        self.assertEqual([item for block in esl.stream('lst',batch_size=2) for item in block],esl.inn().lst)
+
+    def test_failed_append(self):
+        esl = ESL.from_cluster('append_failed')
+        esl.register(lst=[(1,2),b'x'])
+        with self.assertRaises(Exception):
+            esl.append('lst',[threading.Lock()]) # can not be encoded.
+        esl = self.reopen(esl)
+        self.assertEqual(esl.inn().lst,[(1,2),b'x'])
+        esl.append('lst',[(3,4)])
+        with self.assertRaises(Exception):
+            esl.append('lst',[threading.Lock()])
+        esl = self.reopen(esl)
+        self.assertEqual(esl.inn().lst,[(1,2),b'x',(3,4)])
+
+    def test_stray_lines_file(self):
+        esl = ESL.from_cluster('append_stray')
+        esl.register(lst=[(1,2),b'x'])
+        InnerWrapper.write_lines(InnerWrapper.stream_path(esl.pwd(),'inner-lst'),[0]) # left by an interrupted append.
+        esl = self.reopen(esl)
+        self.assertEqual(esl.inn().lst,[(1,2),b'x'])
+
+    def test_torn_record(self):
+        esl = ESL.from_cluster('append_torn')
+        esl.append('lst',[1,2])
+        esl.append('lst',[3])
+        path = InnerWrapper.stream_path(esl.pwd(),'inner-lst')
+        with open(path,'r+b') as f:
+            f.truncate(os.path.getsize(path) - 1)
+        esl = self.reopen(esl)
+        self.assertEqual(esl.inn().lst,[1,2])
+        esl.append('lst',[4])
+        esl = self.reopen(esl)
+        self.assertEqual(esl.inn().lst,[1,2,4])
+
+
+if __name__ == '__main__':
+    unittest.main()
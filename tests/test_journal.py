@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from esl.core import ESL
+from esl.journal import Journal
+
+
+class JournalTest(unittest.TestCase):
+    def test_uncommitted_tail(self):
+        with tempfile.TemporaryDirectory() as cluster_pwd:
+            journal = Journal(cluster_pwd)
+            journal.commit([(Journal.__PUT__,'inner/a',b'aaa')])
+            journal.commit([(Journal.__PUT__,'inner/b',b'bbbb'),(Journal.__DEL__,'inner/a',b'')])
+            size = journal.size()
+            with open(journal.path(),'ab') as f:
+                f.write(journal._encode(Journal.__PUT__,'inner/c',b'cc') + b'cc') # never committed.
+                f.write(journal._encode(Journal.__PUT__,'inner/d',b'dddd') + b'd') # torn.
+            self.assertEqual(dict(Journal(cluster_pwd).replay()),{'inner/b':b'bbbb','inner/a':None})
+            self.assertEqual(journal.size(),size)
+            journal.commit([(Journal.__PUT__,'inner/e',b'e')])
+            self.assertEqual(dict(Journal(cluster_pwd).replay()),{'inner/b':b'bbbb','inner/a':None,'inner/e':b'e'})
+
+    def test_destroyed_magic(self):
+        with tempfile.TemporaryDirectory() as cluster_pwd:
+            with open(Journal.s_path(cluster_pwd),'wb') as f:
+                f.write(b'NOTJRNL')
+            with self.assertRaises(IOError):
+                Journal(cluster_pwd).replay()
+
+
+class JournalReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.root_dir = ESL.__ROOT_DIR__
+        ESL.config_meta_path(save_path=self.root.name)
+
+    def tearDown(self):
+        for cluster_id in [cluster_id for cluster_id in ESL.__GLB_ESL_DICT__ if cluster_id.startswith('GLB@journal')]:
+            del ESL.__GLB_ESL_DICT__[cluster_id]
+        ESL.__ROOT_DIR__ = self.root_dir
+        self.root.cleanup()
+
+    def crash(self,esl,**kwargs):
+        del ESL.__GLB_ESL_DICT__[esl.cluster_id] # dropped without close.
+        return ESL.from_cluster(esl.cluster_name,**kwargs)
+
+    def test_delete_over_stale_file(self):
+        esl = ESL.from_cluster('journal_del',journal=True)
+        esl.register(x=np.arange(1000),y=np.ones(1000))
+        esl.checkpoint()
+        self.assertTrue(os.path.exists(os.path.join(esl.pwd(),'np-x.npy')))
+        Journal(esl.pwd()).commit([(Journal.__DEL__,'np/x',b'')]) # the crash came before the cluster info was written.
+        esl = self.crash(esl,journal=True)
+        self.assertFalse(hasattr(esl.np(),'x'))
+        self.assertTrue(np.array_equal(esl.np().y,np.ones(1000)))
+        esl.close()
+        esl = self.crash(esl)
+        self.assertFalse(hasattr(esl.np(),'x'))
+        self.assertFalse(os.path.exists(Journal.s_path(esl.pwd())))
+
+    def test_crash_before_reset(self):
+        esl = ESL.from_cluster('journal_reset',journal=True)
+        esl.register(x=np.arange(1000))
+        esl.register(x=np.arange(1000) * 2)
+        with mock.patch.object(Journal,'reset'):
+            esl.checkpoint() # folded into the files, the journal is left behind.
+        self.assertTrue(os.path.exists(Journal.s_path(esl.pwd())))
+        esl = self.crash(esl)
+        self.assertTrue(np.array_equal(esl.np().x,np.arange(1000) * 2))
+        self.assertFalse(os.path.exists(Journal.s_path(esl.pwd()))) # folded again by the cluster without journal.
+        esl = self.crash(esl)
+        self.assertTrue(np.array_equal(esl.np().x,np.arange(1000) * 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import json
+import os
+import tempfile
+import unittest
+import networkx as nx
+from esl.core import ESL
+
+
+class LoadTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.root_dir = ESL.__ROOT_DIR__
+        ESL.config_meta_path(save_path=self.root.name)
+
+    def tearDown(self):
+        for cluster_id in [cluster_id for cluster_id in ESL.__GLB_ESL_DICT__ if cluster_id.startswith('GLB@load')]:
+            del ESL.__GLB_ESL_DICT__[cluster_id]
+        ESL.__ROOT_DIR__ = self.root_dir
+        self.root.cleanup()
+
+    def test_config_error_keeps_entry(self):
+        esl = ESL.from_cluster('load_config')
+        esl.register(g=nx.path_graph(3),h=nx.path_graph(4))
+        esl.close()
+        del ESL.__GLB_ESL_DICT__[esl.cluster_id]
+        with self.assertRaises(ValueError):
+            ESL.from_cluster('load_config',force_delete=True,load_options={('nx','h'):{'view':'bogus'}})
+        with open(os.path.join(esl.pwd(),'info.json'),'r') as f:
+            self.assertEqual(sorted(json.load(f)['nx']),['nx-g','nx-h'])
+        esl = ESL.from_cluster('load_config',force_delete=True)
+        self.assertEqual(sorted(esl.nx().h.edges()),sorted(nx.path_graph(4).edges()))
+
+
+if __name__ == '__main__':
+    unittest.main()
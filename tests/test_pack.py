@@ -0,0 +1,52 @@
+import os
+import zlib
+import struct
+import tempfile
+import unittest
+from esl.pack import PackFile
+
+
+class PackFileTest(unittest.TestCase):
+    def test_torn_index_tail(self):
+        with tempfile.TemporaryDirectory() as cluster_pwd:
+            pack_file = PackFile(cluster_pwd)
+            pack_file.put('inner-a',b'aaa')
+            pack_file.put('inner-b',b'bbbb')
+            with open(pack_file.index_path(),'ab') as f:
+                f.write(PackFile.__RECORD__.pack(PackFile.__PUT__,7,0,3,0) + b'\xff\xfe') # partial record.
+            pack_file = PackFile(cluster_pwd)
+            pack_file.put('inner-c',b'cc')
+            pack_file = PackFile(cluster_pwd)
+            self.assertEqual(sorted(pack_file.index),['inner-a','inner-b','inner-c'])
+            self.assertEqual(pack_file.read('inner-b'),b'bbbb')
+            self.assertEqual(pack_file.read('inner-c'),b'cc')
+
+    def test_destroyed_record(self):
+        with tempfile.TemporaryDirectory() as cluster_pwd:
+            pack_file = PackFile(cluster_pwd)
+            pack_file.put('inner-a',b'aaa')
+            size = os.path.getsize(pack_file.index_path())
+            pack_file.put('inner-b',b'bbbb')
+            with open(pack_file.index_path(),'r+b') as f:
+                f.seek(size + PackFile.__RECORD__.size)
+                f.write(b'X') # flip a byte of the name of inner-b.
+            pack_file = PackFile(cluster_pwd)
+            self.assertEqual(sorted(pack_file.index),['inner-a'])
+            self.assertEqual(os.path.getsize(pack_file.index_path()),size)
+
+    def test_former_index(self):
+        with tempfile.TemporaryDirectory() as cluster_pwd:
+            name = b'pack-0.data'
+            with open(os.path.join(cluster_pwd,'pack-0.data'),'wb') as f:
+                f.write(b'aaa')
+            with open(os.path.join(cluster_pwd,PackFile.__INDEX__),'wb') as f:
+                f.write(PackFile.__MAGIC_V1__ + struct.pack('<H',len(name)) + name)
+                f.write(PackFile.__RECORD__.pack(PackFile.__PUT__,7,0,3,zlib.crc32(b'aaa')) + b'inner-a')
+            pack_file = PackFile(cluster_pwd)
+            self.assertEqual(pack_file.read('inner-a'),b'aaa')
+            pack_file.put('inner-b',b'b')
+            self.assertEqual(sorted(PackFile(cluster_pwd).index),['inner-a','inner-b'])
+
+
+if __name__ == '__main__':
+    unittest.main()